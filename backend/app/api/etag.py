@@ -0,0 +1,44 @@
+"""
+Supporto alle richieste condizionali (ETag / If-None-Match) per gli endpoint
+GET che restituiscono piccoli JSON che cambiano raramente.
+
+La funzione `etag_response` serializza il contenuto con orjson, ne calcola
+un'impronta e:
+- se il client invia un `If-None-Match` corrispondente, risponde `304`
+  senza corpo;
+- altrimenti restituisce il JSON con l'header `ETag`, così che il client
+  possa riutilizzarlo alle richieste successive.
+
+Chi mantiene una cache delle risposte può memorizzare direttamente il
+risultato di `encode_json` (corpo + ETag) e servirlo con `encoded_response`,
+senza riserializzare il contenuto a ogni richiesta.
+"""
+
+import hashlib
+
+import orjson
+from fastapi import Request, Response
+
+
+# Serializza `content` in JSON e ne calcola l'ETag.
+def encode_json(content) -> tuple[bytes, str]:
+    body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    return body, etag
+
+
+# Restituisce `content` come JSON con ETag, oppure 304 se il client lo ha già.
+def etag_response(request: Request, content) -> Response:
+    return encoded_response(request, *encode_json(content))
+
+
+# Come `etag_response`, ma con corpo ed ETag già calcolati da `encode_json`.
+def encoded_response(request: Request, body: bytes, etag: str) -> Response:
+    # If-None-Match può contenere più valori separati da virgola (o "*").
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(body, media_type="application/json", headers={"ETag": etag})
@@ -3,7 +3,7 @@ Endpoint dedicati alla gestione dei vincoli dell’applicazione.
 
 Questo modulo espone un insieme di operazioni per validare, salvare e
 recuperare file di vincoli (constraints). La logica di validazione è
-delegata al servizio interno `validate_constraints`, mentre qui vengono
+delegata al servizio `validate_constraints_cached`, mentre qui vengono
 gestite le interazioni via API e il salvataggio su file system.
 
 Funzionalità principali:
@@ -19,71 +19,161 @@ La directory di salvataggio viene creata automaticamente se non esiste.
 """
 
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from datetime import datetime
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from pathlib import Path
-import json
+from pydantic import ValidationError
+import itertools
+import mmap
+import os
+import time
+import orjson
 
 from ...domain.models import ConstraintsPayload
-from ...services.constraints_service import validate_constraints
+from ...services.constraints_service import validate_constraints_cached
+from ..etag import etag_response
 
 router = APIRouter(prefix="/api/constraints", tags=["constraints"])
 
-DATA_DIR = Path(__file__).resolve().parents[4] / "data" / "constraints"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+# Il percorso è ricavato dai soli parent di __file__ (già assoluto), senza
+# resolve(); la directory viene creata solo se non esiste ancora.
+DATA_DIR = Path(__file__).parents[4] / "data" / "constraints"
+try:
+    os.stat(DATA_DIR)
+except FileNotFoundError:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+# Contatore progressivo dei salvataggi di questo processo.
+_save_seq = itertools.count()
 
 # Salva un payload di vincoli in un file JSON con timestamp.
+# La scrittura è atomica: il contenuto va prima in un file temporaneo,
+# sincronizzato su disco, che poi sostituisce il file definitivo.
 def _save_constraints(payload: dict) -> str:
-    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    fname = DATA_DIR / f"constraints-{ts}.json"
-    with open(fname, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    # Timestamp al secondo (ordinabile, come i file esistenti) seguito dai
+    # nanosecondi e da un contatore di processo: salvataggi ravvicinati
+    # non sovrascrivono più lo stesso file.
+    secs, frac = divmod(time.time_ns(), 1_000_000_000)
+    ts = time.strftime("%Y%m%d-%H%M%S", time.localtime(secs))
+    fname = DATA_DIR / f"constraints-{ts}-{frac:09d}-{next(_save_seq)}.json"
+    buf = orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+
+    tmp = fname.with_suffix(".json.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, fname)
     return fname.name
 
 # Valida i vincoli inviati dal client.
 @router.post("/validate")
-def validate(payload: ConstraintsPayload):
-    result = validate_constraints(payload.constraints)
+async def validate(payload: ConstraintsPayload):
+    result = await validate_constraints_cached(payload.constraints)
     return result
 
 # Valida e, se tutto è corretto, salva i vincoli su file.
 @router.post("/save")
-def save_constraints(payload: ConstraintsPayload):
-    result = validate_constraints(payload.constraints)
+async def save_constraints(payload: ConstraintsPayload):
+    result = await validate_constraints_cached(payload.constraints)
     if not result["ok"]:
         return {"ok": False, "errors": result["errors"]}
-    fname = _save_constraints(payload.model_dump())
+    # La scrittura (con fsync) resta bloccante: va nel threadpool.
+    fname = await run_in_threadpool(_save_constraints, payload.model_dump())
     return {"ok": True, "file": fname}
 
+# Elenco dei file in cache, valido finché non cambia l'mtime della directory
+# (creazione o cancellazione di un file aggiornano l'mtime).
+_files_cache: tuple = (None, [])
+
+# Restituisce l'elenco ordinato dei file di vincoli, rileggendo la directory
+# solo se è stata modificata dall'ultima lettura.
+def _cached_list_files() -> list:
+    global _files_cache
+    mtime = DATA_DIR.stat().st_mtime_ns
+    cached_mtime, cached_files = _files_cache
+    if cached_mtime == mtime:
+        return cached_files
+
+    with os.scandir(DATA_DIR) as it:
+        files = sorted(
+            e.name for e in it
+            if e.name.startswith("constraints-") and e.name.endswith(".json")
+        )
+    _files_cache = (mtime, files)
+    return files
+
 # Restituisce la lista dei file di vincoli salvati nel sistema.
 @router.get("/files")
-def list_files():
-    files = sorted([p.name for p in DATA_DIR.glob("constraints-*.json")])
-    return {"files": files}
+def list_files(request: Request):
+    return etag_response(request, {"files": _cached_list_files()})
 
 # Restituisce il contenuto di un file di vincoli specifico.
+# Il file è già JSON: viene inviato così com'è, senza decodifica e
+# ri-serializzazione.
 @router.get("/file/{name}")
 def get_file(name: str):
     fp = DATA_DIR / name
-    if not fp.exists():
+    if not fp.is_file():
         raise HTTPException(404, "File non trovato")
-    with open(fp, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
+    return FileResponse(fp, media_type="application/json")
+
+# Dimensione massima accettata per un file di vincoli importato.
+_MAX_UPLOAD_SIZE = 16 * 1024 * 1024
+
+# Sotto questa dimensione l'upload è letto direttamente. È la soglia oltre
+# la quale Starlette riversa l'upload su disco: al di sopra il file ha già
+# un descrittore e può essere mappato senza altre copie.
+_MMAP_MIN_SIZE = 1024 * 1024
+
+# Decodifica il JSON di un file caricato, usando solo l'interfaccia pubblica
+# del file (seek/tell, read, fileno).
+# I file grandi vengono mappati in memoria (mmap), evitando di copiarli per
+# intero in un oggetto bytes; quelli piccoli vengono letti direttamente.
+def _load_upload_json(f):
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if size > _MAX_UPLOAD_SIZE:
+        raise HTTPException(413, "File troppo grande")
+    if size < _MMAP_MIN_SIZE:
+        return orjson.loads(f.read())
+
+    try:
+        fd = f.fileno()
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, AttributeError):
+        # fileno non disponibile.
+        return orjson.loads(f.read())
+
+    with mm, memoryview(mm) as view:
+        return orjson.loads(view)
 
 # Importa un file JSON contenente vincoli e li valida.
 @router.post("/import")
-def import_constraints(file: UploadFile = File(...)):
+async def import_constraints(file: UploadFile = File(...)):
     try:
-        raw = file.file.read()
-        payload = json.loads(raw)
+        payload = await run_in_threadpool(_load_upload_json, file.file)
     finally:
-        file.file.close()
+        await file.close()
 
     if "constraints" not in payload or not isinstance(payload["constraints"], list):
         raise HTTPException(400, "Formato non valido: atteso { constraints: [...] }")
 
-    result = validate_constraints(payload["constraints"])
+    # I vincoli vengono convertiti nei modelli Pydantic, come per /validate:
+    # i controlli sullo schema si applicano ai modelli, non ai dict.
+    try:
+        constraints = ConstraintsPayload.model_validate(
+            {"constraints": payload["constraints"]}
+        ).constraints
+    except ValidationError as e:
+        raise HTTPException(400, f"Vincoli non validi: {e}")
+
+    result = await validate_constraints_cached(constraints)
 
     return {
         "constraints": payload["constraints"],
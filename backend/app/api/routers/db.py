@@ -11,34 +11,38 @@ La logica vera e propria (lettura della lista, selezione e stato corrente)
 tramite API e la validazione degli input.
 """
 
-from fastapi import APIRouter, HTTPException
-from ...database.manager import list_databases, set_active_db, get_current_database_or_default
+from fastapi import APIRouter, HTTPException, Request
+from ...database.manager import (
+    list_databases,
+    set_active_db,
+    get_current_database_or_default,
+)
+from ..etag import etag_response
 
 router = APIRouter(prefix="/api/db", tags=["database"])
 
 # Restituisce l'elenco dei database disponibili e quello attualmente attivo.
 @router.get("/databases")
-def get_databases():
+def get_databases(request: Request):
     try:
-        return {
+        return etag_response(request, {
             "databases": list_databases(),
             "current": get_current_database_or_default()
-        }
+        })
     except Exception as e:
         raise HTTPException(500, str(e))
 
 # Imposta come attivo uno dei database configurati.
 @router.post("/select")
 def select_database(name: str):
-    available = list_databases()
-
-    if name not in available:
+    # set_active_db verifica su Neo4j che il database esista ed è online.
+    try:
+        set_active_db(name)
+    except ValueError:
         raise HTTPException(404, f"Database '{name}' non trovato")
-
-    set_active_db(name)
     return {"selected": name}
 
 # Restituisce il nome del database attualmente in uso.
 @router.get("/current")
-def current_database():
-    return {"current": get_current_database_or_default()}
+def current_database(request: Request):
+    return etag_response(request, {"current": get_current_database_or_default()})
@@ -6,68 +6,188 @@ Il modulo fornisce funzioni per:
 - recuperare l’elenco dei nodi presenti.
 
 Il grafo viene ricostruito dinamicamente interrogando il database selezionato.
-Il disegno dell’immagine utilizza NetworkX e Matplotlib.
+Il disegno dell’immagine utilizza Graphviz (tramite pygraphviz) quando
+disponibile, altrimenti ricade su NetworkX e Matplotlib.
 """
 
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from ...database.manager import set_active_db, get_current_database_or_default
-from ...database.neo4j import get_session
+from ...database.neo4j import get_async_session, read_single, read_value
+from ...cache import TTLCache
 
 import io
+import threading
 import networkx as nx
 import matplotlib
 
 matplotlib.use("Agg")  # backend sicuro per server/headless
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Graphviz è opzionale: layout e rasterizzazione avvengono in C.
+try:
+    import pygraphviz  # noqa: F401
+    HAS_GRAPHVIZ = True
+except ImportError:
+    HAS_GRAPHVIZ = False
 
 # Endpoint per la generazione e consultazione del grafo.
 router = APIRouter(prefix="/api/graph", tags=["graph"])
 
+# Query Cypher costanti: lo stesso testo a ogni richiesta permette a Neo4j
+# di riutilizzare il piano di esecuzione già compilato.
+
+# Impronta del grafo: numero di nodi e di relazioni (dagli store dei
+# conteggi) e id massimo di ciascuno, così anche sostituzioni che lasciano
+# invariati i conteggi (es. un arco cancellato e ricreato) cambiano chiave.
+_Q_GRAPH_FINGERPRINT = """
+CALL { MATCH (n) RETURN count(n) AS n }
+CALL { MATCH ()-[r]->() RETURN count(r) AS r }
+CALL { MATCH (n) RETURN max(id(n)) AS max_n }
+CALL { MATCH ()-[r]->() RETURN max(id(r)) AS max_r }
+RETURN n, r, max_n, max_r
+"""
+
+# Etichetta di un nodo calcolata in Cypher: `name` se valorizzato,
+# altrimenti l'id interno.
+_NODE_LABEL = "CASE WHEN n.name IS NULL OR n.name = '' THEN toString(id(n)) ELSE n.name END"
+
+# Nodi come coppie [id, etichetta] e relazioni come terne [da, a, tipo],
+# in un'unica query: le liste si spacchettano senza accessi per chiave.
+_Q_GRAPH = f"""
+CALL {{
+    MATCH (n)
+    RETURN collect([id(n), {_NODE_LABEL}]) AS nodes
+}}
+CALL {{
+    MATCH (a)-[r]->(b)
+    RETURN collect([id(a), id(b), type(r)]) AS edges
+}}
+RETURN nodes, edges
+"""
+
+# Elenco delle etichette dei nodi.
+_Q_NODES = f"MATCH (n) RETURN {_NODE_LABEL} AS label"
+
+# Figura matplotlib riutilizzata tra le richieste, così da non ricreare a
+# ogni chiamata lo stato interno di figura e assi. È creata senza pyplot
+# (nessuna registrazione nel gestore delle figure) con un canvas Agg.
+# Matplotlib non è thread-safe: il disegno è serializzato da un lock,
+# quindi basta una sola figura.
+_fig = Figure(figsize=(6, 5))
+FigureCanvasAgg(_fig)
+_draw_lock = threading.Lock()
+
+# Anche Graphviz (libcgraph/gvc) non è thread-safe: layout e disegno vanno
+# serializzati, con un lock distinto da quello di matplotlib.
+_graphviz_lock = threading.Lock()
+
+# Cache LRU delle immagini già generate, indicizzata per database e
+# impronta del grafo. L'impronta non vede le modifiche alle proprietà (es.
+# un nodo rinominato): le voci scadono dopo _PNG_TTL secondi, così
+# un'immagine non aggiornata resta servita al più per quel tempo.
+_PNG_TTL = 60
+_png_cache = TTLCache(maxsize=32, ttl=_PNG_TTL)
+
+
+# Restituisce la figura condivisa e i suoi assi, ripuliti.
+# Va chiamata con _draw_lock acquisito.
+def _get_pooled_axes():
+    ax = _fig.gca()
+    ax.clear()
+    return _fig, ax
+
+
+# Disegna il grafo con Graphviz (layout sfdp) e restituisce i byte PNG.
+def _render_png_graphviz(G, labels_map) -> bytes:
+    A = nx.nx_agraph.to_agraph(G)
+    for n in A.nodes():
+        n.attr["label"] = labels_map.get(int(n), n)
+    A.node_attr.update(fontsize="8")
+    A.edge_attr.update(fontsize="7")
+    with _graphviz_lock:
+        A.layout(prog="sfdp")
+        return A.draw(format="png")
+
+
+# Disegna il grafo con NetworkX + Matplotlib e restituisce i byte PNG.
+def _render_png_matplotlib(G, labels_map) -> bytes:
+    with _draw_lock:
+        fig, ax = _get_pooled_axes()
+        pos = nx.spring_layout(G)
+
+        nx.draw(
+            G,
+            pos,
+            ax=ax,
+            labels=labels_map,
+            with_labels=True,
+            node_size=600,
+            font_size=8,
+            arrows=True
+        )
+
+        edge_labels = {(u, v): d["label"] for u, v, d in G.edges(data=True)}
+        nx.draw_networkx_edge_labels(
+            G, pos, edge_labels=edge_labels, font_size=7, ax=ax
+        )
+
+        fig.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        return buf.getvalue()
+
+
+# Sceglie il motore di disegno disponibile (Graphviz se installato).
+def _render_png(G, labels_map) -> bytes:
+    if HAS_GRAPHVIZ:
+        return _render_png_graphviz(G, labels_map)
+    return _render_png_matplotlib(G, labels_map)
 
+
+# Le interrogazioni a Neo4j usano il driver asincrono; la gestione dello
+# stato (sincrona) e il disegno dell'immagine girano nel threadpool per non
+# bloccare l'event loop.
 @router.get("/image")
-def get_graph_image(instance: str = Query(...)):
+async def get_graph_image(instance: str = Query(...)):
 
     # 1) Seleziona database
     try:
-        set_active_db(instance)
+        await run_in_threadpool(set_active_db, instance)
     except Exception:
         raise HTTPException(400, f"Database '{instance}' non esiste.")
 
-    db = get_current_database_or_default()
+    db = await run_in_threadpool(get_current_database_or_default)
 
-    # 2) Estrae nodi + relazioni
+    # 2) Estrae nodi + relazioni con un unico round-trip verso Neo4j.
+    #    Prima calcola un'impronta economica del grafo (conteggi letti dagli
+    #    store di Neo4j): se l'immagine è già in cache la restituisce subito.
     try:
-        with get_session(db) as s:
-
-            # id + nome nodo
-            node_rows = list(
-                s.run("""
-                    MATCH (n)
-                    RETURN id(n) AS id, n.name AS name
-                """)
-            )
-
-            nodes = [r["id"] for r in node_rows]
-
-            # Mappa: id → etichetta da visualizzare.
-            labels_map = {
-                r["id"]: (r["name"] if r["name"] else str(r["id"]))
-                for r in node_rows
-            }
-
-            # Lettura relazioni con tipo e nodi estremi.
-            edges = [
-                (r["a"], r["b"], r["type"])
-                for r in s.run("""
-                    MATCH (a)-[r]->(b)
-                    RETURN id(a) AS a, id(b) AS b, type(r) AS type
-                """)
-            ]
+        async with get_async_session(db) as s:
+            fp = await read_single(s, _Q_GRAPH_FINGERPRINT)
+            cache_key = f"{db}:{fp['n']}:{fp['r']}:{fp['max_n']}:{fp['max_r']}"
+
+            cached = _png_cache.get(cache_key)
+            if cached is not None:
+                return Response(cached, media_type="image/png")
+
+            rec = await read_single(s, _Q_GRAPH)
 
     except Exception as e:
         raise HTTPException(500, f"Errore Neo4j: {e}")
 
+    # La sessione è già stata rilasciata al pool: l'elaborazione in Python
+    # non tiene occupata la connessione.
+    # Mappa id → etichetta; le chiavi sono la lista dei nodi.
+    labels_map = dict(rec["nodes"])
+    nodes = list(labels_map)
+
+    # Relazioni con tipo e nodi estremi.
+    edges = rec["edges"]
+
     if not nodes:
         raise HTTPException(400, "Il grafo è vuoto, impossibile generare immagine.")
 
@@ -80,63 +200,34 @@ def get_graph_image(instance: str = Query(...)):
 
     # 4) Disegno immagine
     try:
-        fig = plt.figure(figsize=(6, 5))
-        pos = nx.spring_layout(G)
-
-        nx.draw(
-            G,
-            pos,
-            labels=labels_map,
-            with_labels=True,
-            node_size=600,
-            font_size=8,
-            arrows=True
-        )
-
-        edge_labels = {(u, v): d["label"] for u, v, d in G.edges(data=True)}
-        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=7)
-
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        plt.close(fig)
-        buf.seek(0)
-
+        png = await run_in_threadpool(_render_png, G, labels_map)
     except Exception as e:
         raise HTTPException(500, f"Errore generazione immagine: {e}")
 
-    return StreamingResponse(buf, media_type="image/png")
+    # I byte PNG sono già in memoria (e in cache): vengono inviati in un'unica
+    # scrittura, senza riavvolgerli in un BytesIO da iterare a blocchi.
+    _png_cache.set(cache_key, png)
+    return Response(png, media_type="image/png")
 
 
  
 #Restituisce la lista dei nodi del grafo corrente (proprietà name).
 @router.get("/nodes")
-def get_graph_nodes(instance: str = Query(...)):
+async def get_graph_nodes(instance: str = Query(...)):
    
     try:
-        set_active_db(instance)
+        await run_in_threadpool(set_active_db, instance)
     except Exception:
         raise HTTPException(400, f"Database '{instance}' non esiste.")
 
-    db = get_current_database_or_default()
+    db = await run_in_threadpool(get_current_database_or_default)
 
-    # Recupero nodi dal database Neo4j.
+    # Recupero nodi dal database Neo4j: l'etichetta leggibile (nome o id)
+    # è già calcolata dalla query e value() ne restituisce la colonna.
     try:
-        with get_session(db) as s:
-            node_rows = list(
-                s.run("""
-                    MATCH (n)
-                    RETURN id(n) AS id, n.name AS name
-                """)
-            )
+        async with get_async_session(db) as s:
+            nodes = await read_value(s, _Q_NODES, "label")
     except Exception as e:
         raise HTTPException(500, f"Errore Neo4j: {e}")
 
-    # Conversione in lista leggibile (nome o id).
-    nodes = [
-        (r["name"] if r["name"] else str(r["id"]))
-        for r in node_rows
-    ]
-
     return {"nodes": nodes}
@@ -11,40 +11,39 @@ La logica di accesso e gestione dei database è delegata al livello
 `database.manager`.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from ...database.manager import (
     list_databases,
     set_active_db,
     get_current_database_or_default,
 )
+from ..etag import etag_response
 
 router = APIRouter(prefix="/api/instances", tags=["instances"])
 
 #Restituisce elenco database in formato corretto per il frontend.
 @router.get("")
-def get_instances():
+def get_instances(request: Request):
     dbs = list_databases()
 
     # Conversione da ["neo4j","esempio"] a [{id:"neo4j"}, {id:"esempio"}]
-    return {
+    return etag_response(request, {
         "instances": [
             {"id": name, "bolt": "bolt://localhost:7687"}
             for name in dbs
         ]
-    }
+    })
 
 
 #Imposta come attiva una specifica istanza/database.
 @router.post("/select/{db_name}")
 def select_instance(db_name: str):
-    available = list_databases()
-
-    # Controlla che il database richiesto esista.
-    if db_name not in available:
+    # Aggiorna il database attivo: set_active_db controlla che il database
+    # richiesto esista.
+    try:
+        set_active_db(db_name)
+    except ValueError:
         raise HTTPException(404, f"Database '{db_name}' non trovato")
-
-    # Aggiorna il database attivo.
-    set_active_db(db_name)
     return {"selected": db_name}
 
 
@@ -9,6 +9,7 @@ coerenti con l’API.
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from ...services.measures import compute_measures
+from ...database.manager import recover_from_missing_database
 
 router = APIRouter(prefix="/api/measures", tags=["measures"])
 
@@ -26,4 +27,5 @@ def measures_compute(req: MeasuresRequest):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        recover_from_missing_database(e)
         raise HTTPException(status_code=500, detail=f"Internal error: {e}")
\ No newline at end of file
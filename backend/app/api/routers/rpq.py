@@ -11,6 +11,7 @@ vengono gestiti input, validazione e formattazione degli errori.
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from ...services.rpq_inclusion import check_inclusion
+from ...database.manager import recover_from_missing_database
 
 router = APIRouter(prefix="/api/rpq", tags=["rpq"])
 
@@ -28,5 +29,7 @@ def rpq_check(payload: RPQConstraint):
         # Errori tipicamente dovuti a sintassi RPQ non valida.
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        # Errori imprevisti lato server.
+        # Errori imprevisti lato server (se il database attivo non esiste
+        # più, si torna su 'neo4j' per le richieste successive).
+        recover_from_missing_database(e)
         raise HTTPException(status_code=500, detail=f"Errore: {e}")
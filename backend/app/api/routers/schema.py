@@ -4,58 +4,170 @@ Endpoint dedicati all’ispezione dello schema del database Neo4j.
 Il modulo espone un’operazione che restituisce:
 - l’elenco delle labels presenti nel grafo,
 - i tipi di relazione disponibili,
-- i nodi con la loro proprietà `name` (o l'id se il nome non è definito).
+- i nodi con la loro proprietà `name` (o l'id se il nome non è definito),
+  eventualmente a pagine tramite i parametri `page` e `limit`.
+
+L'endpoint `/nodes` restituisce invece i soli nodi in streaming (NDJSON, una
+riga per nodo), senza costruire in memoria l'elenco completo.
 
 L’interrogazione viene eseguita direttamente sul database selezionato,
-utilizzando le procedure built-in di Neo4j quando disponibili.
+utilizzando le procedure built-in di Neo4j quando disponibili. I risultati
+sono mantenuti in una breve cache TTL, svuotabile tramite `/invalidate`.
 """
 
 
-from fastapi import APIRouter, HTTPException
-from ...database.neo4j import get_session
-from ...database.manager import get_current_database_or_default
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from ...database.neo4j import get_async_session, read_single
+from ...database.manager import get_current_database_or_default, recover_from_missing_database
+from ...cache import TTLCache
+from ...services.constraints_service import clear_schema_cache, clear_validation_cache
+from ...services.rpq_inclusion import clear_rpq_cache
+from ..etag import encode_json, encoded_response
 
 router = APIRouter(prefix="/api/schema", tags=["schema"])
 
+# Etichetta di un nodo calcolata direttamente in Cypher: `name` se
+# valorizzato, altrimenti l'id interno.
+_NODE_LABEL = "CASE WHEN n.name IS NULL OR n.name = '' THEN toString(id(n)) ELSE n.name END"
+
+# Query costanti (piano riutilizzabile da Neo4j): labels, tipi di relazione
+# e nodi in un'unica interrogazione composta.
+_Q_SCHEMA_META = """
+CALL {
+    CALL db.labels() YIELD label
+    RETURN collect(label) AS labels
+}
+CALL {
+    CALL db.relationshipTypes() YIELD relationshipType
+    RETURN collect(relationshipType) AS rel_types
+}
+"""
+
+# Variante completa: tutti i nodi del grafo.
+_Q_SCHEMA = _Q_SCHEMA_META + f"""
+CALL {{
+    MATCH (n)
+    RETURN collect({_NODE_LABEL}) AS nodes
+}}
+RETURN labels, rel_types, nodes
+"""
+
+# Variante paginata: una pagina di nodi ordinati per id.
+_Q_SCHEMA_PAGE = _Q_SCHEMA_META + f"""
+CALL {{
+    MATCH (n)
+    WITH n ORDER BY id(n) SKIP $skip LIMIT $limit
+    RETURN collect({_NODE_LABEL}) AS nodes
+}}
+RETURN labels, rel_types, nodes
+"""
+
+# Solo i nodi, una riga per nodo, per lo streaming.
+_Q_NODE_NAMES = f"MATCH (n) RETURN id(n) AS id, {_NODE_LABEL} AS name"
+
+# Numero di righe NDJSON accumulate prima di inviare un blocco al client.
+_STREAM_BATCH = 500
+
+# Cache dei metadati di schema: lo schema cambia raramente, quindi le
+# risposte vengono riutilizzate per 30 secondi per ciascun database.
+# Si memorizza il JSON già serializzato (corpo + ETag): un hit non
+# richiede né Neo4j né una nuova serializzazione.
+_schema_cache = TTLCache(maxsize=32, ttl=30)
+
+
+# Legge dal database labels, tipi di relazione e nodi (driver asincrono).
+# Con `limit` restituisce solo la pagina richiesta e il cursore `next_page`.
+async def _load_schema(db: str, page: int = 1, limit: int = None) -> dict:
+    # Apertura sessione Neo4j: labels, tipi di relazione e nodi vengono
+    # letti con un'unica query composta (un solo round-trip), in una
+    # transazione di sola lettura.
+    async with get_async_session(db) as session:
+        if limit is None:
+            rec = await read_single(session, _Q_SCHEMA)
+        else:
+            # Si legge un nodo in più per sapere se esiste una pagina successiva.
+            rec = await read_single(
+                session, _Q_SCHEMA_PAGE, skip=(page - 1) * limit, limit=limit + 1
+            )
+
+    schema = {
+        "labels": list(rec["labels"]),
+        "rel_types": list(rec["rel_types"]),
+        "nodes": list(rec["nodes"]),
+    }
+
+    if limit is not None:
+        has_more = len(schema["nodes"]) > limit
+        schema["nodes"] = schema["nodes"][:limit]
+        schema["next_page"] = page + 1 if has_more else None
+
+    return schema
+
+
 #Ritorna labels, relazioni e nodi (property name).
+#Con `limit` i nodi vengono restituiti a pagine (`page` parte da 1).
 @router.get("")
-def get_schema(db: str = None):
+async def get_schema(
+    request: Request,
+    db: str = None,
+    page: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=1),
+):
     try:
         # Se non viene passato un DB esplicito, usa quello attivo.
         if db is None:
-            db = get_current_database_or_default()
-
-        # Apertura sessione Neo4j.
-        with get_session(db) as session:
-
-            # Estrae tutte le labels definite nel grafo.
-            labels = [
-                r["label"] for r in session.run(
-                    "CALL db.labels() YIELD label RETURN label"
-                )
-            ]
-
-            # Estrae tutti i tipi di relazione presenti.
-            rel_types = [
-                r["type"] for r in session.run(
-                    "CALL db.relationshipTypes() YIELD relationshipType AS type RETURN type"
-                )
-            ]
-
-            # Estrae i nodi usando `name` come etichetta quando possibile.
-            nodes = [
-                (r["name"] if r["name"] else str(r["id"]))
-                for r in session.run("""
-                    MATCH (n)
-                    RETURN id(n) AS id, n.name AS name
-                """)
-            ]
-
-        return {
-            "labels": labels,
-            "rel_types": rel_types,
-            "nodes": nodes
-        }
+            db = await run_in_threadpool(get_current_database_or_default)
+
+        key = (db, "schema", page if limit else 1, limit)
+        encoded = _schema_cache.get(key)
+        if encoded is None:
+            encoded = encode_json(await _load_schema(db, page, limit))
+            _schema_cache.set(key, encoded)
+        return encoded_response(request, *encoded)
 
     except Exception as e:
+        # Database attivo non più esistente: torna su 'neo4j' per le
+        # richieste successive.
+        await run_in_threadpool(recover_from_missing_database, e)
         raise HTTPException(500, f"Errore Neo4j: {e}")
+
+
+# Genera le righe NDJSON dei nodi man mano che arrivano da Neo4j, a blocchi
+# di `_STREAM_BATCH` righe: la memoria usata non dipende dal numero di nodi.
+async def _stream_node_names(db: str):
+    async with get_async_session(db) as session:
+        result = await session.run(_Q_NODE_NAMES)
+        buf = []
+        async for nid, name in result:
+            buf.append(orjson.dumps({"id": nid, "name": name}))
+            if len(buf) >= _STREAM_BATCH:
+                yield b"\n".join(buf) + b"\n"
+                buf.clear()
+        if buf:
+            yield b"\n".join(buf) + b"\n"
+
+
+#Ritorna in streaming (NDJSON) id e nome di tutti i nodi del database.
+#Il primo blocco viene inviato appena arrivano le prime righe.
+@router.get("/nodes")
+async def stream_nodes(db: str = None):
+    if db is None:
+        db = await run_in_threadpool(get_current_database_or_default)
+    return StreamingResponse(_stream_node_names(db), media_type="application/x-ndjson")
+
+
+#Svuota le cache dipendenti dallo schema (es. dopo una migrazione dei dati):
+#quella di questo endpoint, quella usata dalla validazione dei vincoli, i
+#risultati di validazione già calcolati e quelli delle valutazioni RPQ.
+@router.post("/invalidate")
+def invalidate_schema():
+    _schema_cache.clear()
+    clear_schema_cache()
+    clear_validation_cache()
+    clear_rpq_cache()
+    return {"ok": True}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
 router = APIRouter(prefix="/api", tags=["test"])
 
+# Risposta costante, serializzata una sola volta all'import.
+_HELLO_BODY = b'{"message":"Ciao dal backend FastAPI!"}'
+
 @router.get("/hello")
-def hello():
-    return {"message": "Ciao dal backend FastAPI!"}
+async def hello():
+    return Response(_HELLO_BODY, media_type="application/json")
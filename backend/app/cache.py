@@ -0,0 +1,65 @@
+"""
+Cache in memoria con scadenza temporale (TTL) per dati che cambiano di rado.
+
+Il modulo espone la classe `TTLCache`, usata per memorizzare per pochi
+secondi i risultati di interrogazioni su metadati (schema del grafo, elenco
+dei database, ...), evitando di ripetere la stessa query verso Neo4j a ogni
+richiesta. La cache è limitata nel numero di voci ed è sicura rispetto ai
+thread del threadpool di FastAPI.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+# Cache chiave → valore con scadenza e numero massimo di voci.
+class TTLCache:
+
+    def __init__(self, maxsize: int = 32, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Restituisce il valore associato alla chiave, o `default` se assente/scaduto.
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    # Memorizza un valore, eliminando le voci meno recenti oltre il limite.
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    # Restituisce il valore in cache oppure lo calcola con `fn` e lo salva.
+    # Le eccezioni sollevate da `fn` non vengono memorizzate.
+    def get_or_set(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        _missing = object()
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = fn()
+            self.set(key, value)
+        return value
+
+    # Rimuove una singola voce, se presente.
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    # Svuota completamente la cache.
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
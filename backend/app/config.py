@@ -15,11 +15,17 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 # - parametri di connessione a Neo4j
 # - percorso file .env
 class Settings(BaseSettings):
-    CORS_ORIGINS: list[str] = ["http://localhost:5173","http://127.0.0.1:5173"]
+    # Tupla immutabile: il valore non viene mai modificato a runtime.
+    CORS_ORIGINS: tuple[str, ...] = ("http://localhost:5173","http://127.0.0.1:5173")
     NEO4J_URI: str = "bolt://localhost:7687"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str = "password"
     NEO4J_DB: str = "neo4j"
+    # Ripetizioni massime con cui viene espanso l'operatore Kleene star *
+    RPQ_STAR_MAX_REPEAT: int = 3
+    # Runtime Cypher imposto alle query RPQ (es. "pipelined" su Enterprise,
+    # "slotted" su Community); vuoto = scelta automatica di Neo4j
+    NEO4J_CYPHER_RUNTIME: str = ""
     # Configurazione di Pydantic Settings: carica variabili da .env
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
     
@@ -7,15 +7,22 @@ attualmente selezionato.
 Espone tre funzioni principali:
 
 - list_databases(): interroga Neo4j e restituisce i database online.
-- set_active_db(): salva il nome del database attivo.
+- set_active_db(): imposta il database attivo in memoria e lo salva su file
+  in background (un solo thread di scrittura).
 - get_current_database_or_default(): legge lo stato salvato e applica un
-  fallback automatico a 'neo4j' se necessario.
+  fallback automatico a 'neo4j' se necessario; dopo la prima lettura il
+  nome viene servito dalla memoria.
 
 L'import del driver Neo4j è eseguito localmente nelle funzioni per evitare
 cicli di importazione.
 """
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from ..cache import TTLCache
 
 # Cartella dove salviamo lo stato
 STATE_DIR = os.path.join(os.path.dirname(__file__), ".state")
@@ -25,50 +32,127 @@ os.makedirs(STATE_DIR, exist_ok=True)
 ACTIVE_DB_FILE = os.path.join(STATE_DIR, "active_db.txt")
 
 
+# Query costante per l'elenco dei database e il loro stato.
+# Il filtro sullo stato è applicato da Neo4j.
+_Q_SHOW_DBS = (
+    "SHOW DATABASES YIELD name, currentStatus "
+    "WHERE currentStatus = 'online' RETURN name"
+)
+
+# Verifica di esistenza di un singolo database online: il filtro è
+# applicato da Neo4j, che restituisce solo un conteggio.
+_Q_DB_ONLINE = (
+    "SHOW DATABASES YIELD name, currentStatus "
+    "WHERE name = $name AND currentStatus = 'online' "
+    "RETURN count(*) AS c"
+)
+
+# Cache dell'elenco dei database: la topologia del cluster cambia di rado.
+_databases_cache = TTLCache(maxsize=1, ttl=30)
+
+
+#Interroga il database 'system' e restituisce i database online.
+def _fetch_databases():
+    # Import locale per evitare dipendenze circolari.
+    from .neo4j import get_session
+
+    # Usiamo il database 'system' per la query SHOW DATABASES, in una
+    # transazione di sola lettura; value() restituisce la colonna dei nomi.
+    with get_session("system") as s:
+        return s.execute_read(lambda tx: tx.run(_Q_SHOW_DBS).value("name"))
+
+
 #Ricava la lista dei database leggendo il cluster Neo4j tramite cypher.
 def list_databases():
     """
     NOTA: qui NON importiamo neo4j per evitare circular import.
     L'import verrà fatto localmente dentro la funzione.
+
+    Il risultato resta in cache per 30 secondi; in caso di errore
+    non viene memorizzato e si ricade su ['neo4j'].
     """
 
     try:
-        # Import locale per evitare dipendenze circolari.
-        from .neo4j import get_session
-
-        # Usiamo il database 'system' per la query SHOW DATABASES.
-        with get_session("system") as s:
-            rows = s.run("SHOW DATABASES").data()
-
-        # Ritorniamo solo quelli online.
-        return [
-            row["name"] 
-            for row in rows 
-            if row.get("currentStatus") == "online"
-        ]
+        return _databases_cache.get_or_set(("system", "list_databases"), _fetch_databases)
 
     except Exception as e:
         print("WARNING: impossibile leggere i database da Neo4j:", e)
         return ["neo4j"]
 
-#Imposta e salva localmente il database attualmente selezionato.
+# Nome del database attivo mantenuto in memoria: evita di rileggere il file
+# di stato (e di interrogare Neo4j) a ogni richiesta. Viene popolato alla
+# prima lettura e aggiornato da set_active_db.
+_active_db_cache: Optional[str] = None
+
+# Serializza le modifiche allo stato in memoria.
+_state_lock = threading.Lock()
+
+# Unico thread incaricato di scrivere il file di stato: le richieste non
+# attendono il disco e le scritture avvengono nell'ordine di arrivo.
+_state_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="active-db")
+
+
+#Controlla su Neo4j se il database indicato esiste ed è online.
+def _database_online(name: str) -> bool:
+    from .neo4j import get_session
+
+    with get_session("system") as s:
+        rec = s.execute_read(lambda tx: tx.run(_Q_DB_ONLINE, name=name).single())
+    return rec["c"] > 0
+
+
+#Scrive il nome del database nel file di stato in modo atomico
+#(file temporaneo + rename), così non resta mai un file scritto a metà.
+def _persist_active_db(name: str):
+    tmp = ACTIVE_DB_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, ACTIVE_DB_FILE)
+
+
+#Imposta il database attualmente selezionato.
+#Lo stato in memoria è aggiornato subito; il file viene scritto in
+#background e solo se il database è effettivamente cambiato.
 def set_active_db(name: str):
+    global _active_db_cache
     name = name.strip()
 
-    available = list_databases()
-    if name not in available:
+    # Database già attivo (e già verificato): nulla da fare.
+    if name == _active_db_cache:
+        return
+
+    try:
+        online = _database_online(name)
+    except Exception:
+        # Neo4j non raggiungibile: si ricade sull'elenco (con fallback).
+        online = name in list_databases()
+
+    if not online:
+        # L'elenco completo serve solo per il messaggio di errore.
+        available = list_databases()
         raise ValueError(
             f"Database '{name}' non presente. Disponibili: {available}"
         )
 
-    # Scrive il database selezionato nel file di stato.
-    with open(ACTIVE_DB_FILE, "w", encoding="utf-8") as f:
-        f.write(name)
+    with _state_lock:
+        if name == _active_db_cache:
+            return
+        _active_db_cache = name
+        # Cambio di database: l'elenco in cache viene riletto alla
+        # prossima richiesta.
+        _databases_cache.clear()
+        _state_writer.submit(_persist_active_db, name)
 
 # Restituisce il database attualmente salvato nello stato.
-#Se il file non esiste o contiene un nome non valido,
-#viene impostato e ritornato il database 'neo4j'
+#Se il file non esiste o è vuoto, viene impostato e ritornato 'neo4j'.
+#Il nome salvato non viene più verificato su Neo4j a ogni lettura: il
+#controllo avviene all'avvio (validate_active_db) e in set_active_db,
+#mentre un database sparito viene gestito da recover_from_missing_database.
 def get_current_database_or_default():
+    global _active_db_cache
+    if _active_db_cache is not None:
+        return _active_db_cache
+
     if not os.path.exists(ACTIVE_DB_FILE):
         set_active_db("neo4j")
         return "neo4j"
@@ -76,9 +160,32 @@ def get_current_database_or_default():
     with open(ACTIVE_DB_FILE, "r", encoding="utf-8") as f:
         db = f.read().strip()
 
-    # Se il database salvato non è più disponibile, fallback su 'neo4j'.
-    if db not in list_databases():
+    if not db:
         set_active_db("neo4j")
         return "neo4j"
 
+    _active_db_cache = db
     return db
+
+#Verifica (all'avvio) che il database salvato sia ancora disponibile,
+#altrimenti ricade su 'neo4j'.
+def validate_active_db():
+    db = get_current_database_or_default()
+    if db not in list_databases():
+        set_active_db("neo4j")
+
+#Se l'errore indica che il database attivo non esiste più, ripristina
+#'neo4j' come database attivo. Ritorna True se il ripristino è avvenuto.
+def recover_from_missing_database(exc: Exception) -> bool:
+    from neo4j.exceptions import ClientError
+
+    if not isinstance(exc, ClientError):
+        return False
+    if exc.code != "Neo.ClientError.Database.DatabaseNotFound":
+        return False
+
+    try:
+        set_active_db("neo4j")
+    except ValueError:
+        return False
+    return True
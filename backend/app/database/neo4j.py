@@ -5,28 +5,46 @@ Il modulo espone funzioni per inizializzare il driver, aprire una sessione
 verso il database attivo e chiudere eventuali connessioni. Le credenziali
 vengono lette dalla configurazione dell’applicazione e ogni sessione è
 collegata automaticamente al database selezionato tramite lo stato interno.
+
+Accanto al driver sincrono è disponibile un driver asincrono
+(`get_async_session`), usato dagli endpoint `async def` per non occupare
+un thread del threadpool durante l'attesa di Neo4j.
+
+Le letture passano da `read_single` / `read_value`, che le eseguono come
+transazioni di sola lettura: in un cluster Neo4j possono così essere
+instradate sulle repliche in lettura.
 """
 
-from neo4j import GraphDatabase
+from contextlib import contextmanager
+
+from neo4j import GraphDatabase, AsyncGraphDatabase
 from .manager import get_current_database_or_default
 
 _driver = None
+_async_driver = None
+
+# Dimensionamento del pool di connessioni condiviso dai driver.
+POOL_OPTIONS = {
+    "max_connection_pool_size": 50,
+    "connection_acquisition_timeout": 30,
+}
 
 #Inizializza il driver globale se non è già stato creato.
 def init_driver(uri: str, user: str, password: str):
     global _driver
     if _driver is None:
-        _driver = GraphDatabase.driver(uri, auth=(user, password))
+        _driver = GraphDatabase.driver(uri, auth=(user, password), **POOL_OPTIONS)
 
-#Crea un driver per l'istanza corrente.
-#Usa sempre le credenziali del profilo .env.
+#Restituisce il driver globale (con il suo pool di connessioni).
+#Se non è ancora stato creato, lo inizializza dal profilo .env.
 def get_driver():
-    from ..config import get_settings
-    settings = get_settings()
-    return GraphDatabase.driver(
-        settings.NEO4J_URI,
-        auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-    )
+    if _driver is None:
+        from ..config import get_settings
+        settings = get_settings()
+        init_driver(
+            settings.NEO4J_URI, settings.NEO4J_USER, settings.NEO4J_PASSWORD
+        )
+    return _driver
 
 #Restituisce una sessione collegata al database attivo.
 #Se il nome non è specificato, viene usato quello salvato nello stato.
@@ -37,9 +55,75 @@ def get_session(database: str = None):
     driver = get_driver()
     return driver.session(database=database)
 
+#Esegue una query minima all'avvio: apre la prima connessione del pool e
+#verifica il database, così la prima richiesta reale non paga questo costo.
+def warmup_driver(database: str = None):
+    with get_session(database) as s:
+        s.run("MATCH (n) RETURN count(n) AS c").consume()
+
+#Riusa la sessione ricevuta oppure, se assente, ne apre una nuova che
+#viene chiusa all'uscita. Permette a una funzione di servizio di condividere
+#la sessione del chiamante quando viene invocata più volte di seguito.
+@contextmanager
+def session_scope(session=None, database: str = None):
+    if session is not None:
+        yield session
+    else:
+        with get_session(database) as s:
+            yield s
+
 #Chiude il driver globale, se presente, e lo resetta.
 def close_driver():
     global _driver
     if _driver:
         _driver.close()
         _driver = None
+
+#Inizializza il driver asincrono globale se non è già stato creato.
+def init_async_driver(uri: str, user: str, password: str):
+    global _async_driver
+    if _async_driver is None:
+        _async_driver = AsyncGraphDatabase.driver(
+            uri, auth=(user, password), **POOL_OPTIONS
+        )
+
+#Restituisce il driver asincrono, creandolo dal profilo .env se necessario.
+def get_async_driver():
+    if _async_driver is None:
+        from ..config import get_settings
+        settings = get_settings()
+        init_async_driver(
+            settings.NEO4J_URI, settings.NEO4J_USER, settings.NEO4J_PASSWORD
+        )
+    return _async_driver
+
+#Restituisce una sessione asincrona sul database indicato.
+#Il nome va passato esplicitamente: la lettura dello stato è sincrona.
+def get_async_session(database: str):
+    return get_async_driver().session(database=database)
+
+# Funzioni di transazione per le letture asincrone.
+async def _tx_single(tx, query: str, params: dict):
+    result = await tx.run(query, params)
+    return await result.single()
+
+async def _tx_value(tx, query: str, key: str, params: dict):
+    result = await tx.run(query, params)
+    return await result.value(key)
+
+#Esegue una query in una transazione di sola lettura e ne restituisce
+#l'unico record.
+async def read_single(session, query: str, **params):
+    return await session.execute_read(_tx_single, query, params)
+
+#Esegue una query in una transazione di sola lettura e ne restituisce la
+#colonna `key` come lista.
+async def read_value(session, query: str, key: str, **params):
+    return await session.execute_read(_tx_value, query, key, params)
+
+#Chiude il driver asincrono globale, se presente, e lo resetta.
+async def close_async_driver():
+    global _async_driver
+    if _async_driver:
+        await _async_driver.close()
+        _async_driver = None
@@ -9,7 +9,7 @@ di vincoli, validati automaticamente da Pydantic.
 """
 
 from pydantic import BaseModel, Field
-from typing import Literal, List, Union
+from typing import Annotated, Literal, List, Union
 
 # Vincolo che impone che una certa label sia presente nel grafo.
 class NodeLabelConstraint(BaseModel):
@@ -24,7 +24,12 @@ class EdgeTypeConstraint(BaseModel):
     to_label: str = Field(..., min_length=1)
 
 # Alias che rappresenta un vincolo generico (uno dei modelli sopra).
-Constraint = Union[NodeLabelConstraint, EdgeTypeConstraint]
+# L'unione è "taggata" sul campo `type`: Pydantic sceglie direttamente il
+# modello corretto invece di provarli tutti in sequenza.
+Constraint = Annotated[
+    Union[NodeLabelConstraint, EdgeTypeConstraint],
+    Field(discriminator="type"),
+]
 
 # Payload principale che contiene la lista dei vincoli.
 
@@ -12,6 +12,7 @@ della connessione.
 """
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
@@ -19,30 +20,57 @@ from .config import get_settings
 from .api.routers import test_router, graph_router,schema_router,constraints_router, rpq_router, db_router, measures_router, instances_router
 
 
-from .database.neo4j import init_driver, close_driver
+from .database.neo4j import init_driver, get_driver, close_driver, init_async_driver, close_async_driver, warmup_driver
+from .database.manager import validate_active_db, get_current_database_or_default
+
+# Impostazioni lette una sola volta all'import del modulo.
+settings = get_settings()
 
 # Gestione del ciclo di vita dell’app:
-# inizializza il driver alla startup, lo chiude allo shutdown.
+# inizializza i driver (sincrono e asincrono) alla startup, li chiude allo shutdown.
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    s = get_settings()
+    s = settings
     init_driver(s.NEO4J_URI, s.NEO4J_USER, s.NEO4J_PASSWORD)
+    init_async_driver(s.NEO4J_URI, s.NEO4J_USER, s.NEO4J_PASSWORD)
+    # Con Neo4j non raggiungibile l'app parte comunque: le verifiche
+    # sul database vengono saltate e il driver si collega alla prima
+    # richiesta. verify_connectivity fallisce subito, senza i tentativi
+    # ripetuti delle transazioni di lettura.
+    try:
+        get_driver().verify_connectivity()
+    except Exception as e:
+        print("WARNING: Neo4j non raggiungibile all'avvio:", e)
+    else:
+        # Verifica una sola volta che il database salvato sia ancora online.
+        try:
+            validate_active_db()
+        except Exception as e:
+            print("WARNING: impossibile verificare il database attivo:", e)
+        # Prima connessione del pool aperta sul database attivo.
+        try:
+            warmup_driver(get_current_database_or_default())
+        except Exception as e:
+            print("WARNING: warm-up del driver Neo4j non riuscito:", e)
     try:
         yield
     finally:
         close_driver()
+        await close_async_driver()
 
 # Creazione dell’applicazione FastAPI con lifecycle personalizzato.
-app = FastAPI(lifespan=lifespan)
+# Le risposte vengono serializzate con orjson, più rapido del json standard.
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Configurazione CORS permettendo al frontend di accedere all’API.
 #CORS significa Cross-Origin Resource Sharing.
 #È un meccanismo di sicurezza dei browser che decide quali siti 
 #web possono fare richieste a un certo server.
-s = get_settings()
+#Le origin sono passate come frozenset: il controllo `origin in ...`
+#fatto dal middleware a ogni richiesta diventa una ricerca O(1).
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=s.CORS_ORIGINS,
+    allow_origins=frozenset(settings.CORS_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
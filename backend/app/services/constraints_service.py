@@ -10,55 +10,148 @@ Sulla base di queste informazioni controlla che ogni vincolo fornito
 sia coerente con lo schema corrente del grafo.
 """
 
+import hashlib
 from typing import List, Dict, Any
-from ..database.neo4j import get_session
-from ..config import get_settings
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from ..database.neo4j import get_async_session, read_single
 from ..domain.models import Constraint, NodeLabelConstraint, EdgeTypeConstraint
 from ..database.manager import get_current_database_or_default
+from ..cache import TTLCache
+
+
+# Durata (secondi) delle informazioni di schema in cache: lo schema cambia
+# raramente.
+SCHEMA_TTL = 60
+
+# Cache (labels, rel_types) per database.
+_schema_sets_cache = TTLCache(maxsize=8, ttl=SCHEMA_TTL)
+
+
+# Risultati di validazione per (database attivo, hash della lista di
+# vincoli normalizzata): richieste identiche (es. "Valida" seguito da
+# "Salva") non rieseguono la validazione sullo schema. Le voci scadono
+# insieme allo schema in cache, così una modifica dello schema viene vista
+# anche senza /api/schema/invalidate.
+_validation_cache = TTLCache(maxsize=512, ttl=SCHEMA_TTL)
+
+
+#Svuota la cache dello schema usata dalla validazione.
+def clear_schema_cache():
+    _schema_sets_cache.clear()
+
+
+#Svuota i risultati di validazione già calcolati.
+def clear_validation_cache():
+    _validation_cache.clear()
 
 
 #Carica dallo schema Neo4j tutte le labels e i tipi di relazione disponibili.
-def load_schema_from_db():
-    s = get_settings()
-    with get_session(get_current_database_or_default()) as session:
-        labels = {r["label"] for r in session.run("""
-            MATCH (n) UNWIND labels(n) AS label
-            RETURN DISTINCT label
-        """)}
-        rel_types = {r["type"] for r in session.run("""
-            CALL db.relationshipTypes() YIELD relationshipType AS type
-            RETURN type
-        """)}
-    return labels, rel_types
+#Il risultato resta in cache per SCHEMA_TTL secondi per ciascun database.
+#Senza `db` usa il database attivo, letto in un thread (lettura del file di
+#stato ed eventuale query di fallback sono bloccanti).
+async def load_schema_from_db(db: str = None):
+    if db is None:
+        db = await run_in_threadpool(get_current_database_or_default)
+    cached = _schema_sets_cache.get(db)
+    if cached is None:
+        cached = await _fetch_schema_sets(db)
+        _schema_sets_cache.set(db, cached)
+    return cached
+
+
+# Labels e tipi di relazione letti dalle procedure di metadati di Neo4j
+# (nessuna scansione dei nodi), in un'unica query composta.
+_Q_SCHEMA_SETS = """
+CALL {
+    CALL db.labels() YIELD label
+    RETURN collect(label) AS labels
+}
+CALL {
+    CALL db.relationshipTypes() YIELD relationshipType
+    RETURN collect(relationshipType) AS rel_types
+}
+RETURN labels, rel_types
+"""
+
 
+#Interroga Neo4j (driver asincrono) per labels e tipi di relazione del
+#database indicato, con un solo round-trip in sola lettura.
+async def _fetch_schema_sets(db: str):
+    async with get_async_session(db) as session:
+        rec = await read_single(session, _Q_SCHEMA_SETS)
+    return set(rec["labels"]), set(rec["rel_types"])
+
+
+# Vincolo di esistenza label.
+def _check_node_label(i: int, c: NodeLabelConstraint, labels, rel_types, errors):
+    if c.label not in labels:
+        errors.append({"index": i, "field": "label",
+                       "message": f"Label '{c.label}' non presente nel grafo"})
+
+
+# Vincolo di tipo di relazione tra due label.
+def _check_edge_type(i: int, c: EdgeTypeConstraint, labels, rel_types, errors):
+    if c.from_label not in labels:
+        errors.append({"index": i, "field": "from_label",
+                       "message": f"Label '{c.from_label}' non presente"})
+    if c.to_label not in labels:
+        errors.append({"index": i, "field": "to_label",
+                       "message": f"Label '{c.to_label}' non presente"})
+    if c.rel_type not in rel_types:
+        errors.append({"index": i, "field": "rel_type",
+                       "message": f"RelType '{c.rel_type}' non presente"})
+
+
+# Controllo da applicare per ciascun valore del discriminatore `type`.
+_CHECKS = {
+    "node_label_included": _check_node_label,
+    "edge_type_between": _check_edge_type,
+}
+
+
+async def validate_constraints(constraints: List[Constraint], db: str = None) -> dict:
     """
-    Valida la lista di vincoli confrontandoli con lo schema corrente.
+    Valida la lista di vincoli confrontandoli con lo schema corrente
+    (del database `db`, o di quello attivo se non indicato).
     Controlla che labels e relazioni indicate nei vincoli esistano davvero.
 
     Ritorna un dizionario con:
     - ok: boolean (True se nessun errore),
     - errors: elenco dettagliato delle violazioni.
     """
-def validate_constraints(constraints: List[Constraint]) -> dict:
-    labels, rel_types = load_schema_from_db()
+    labels, rel_types = await load_schema_from_db(db)
     errors: List[Dict[str, Any]] = []
 
-    # Verifica ogni vincolo con controllo puntuale.
+    # Verifica ogni vincolo con il controllo associato al suo `type`
+    # (solo appartenenza a insiemi).
     for i, c in enumerate(constraints):
-        # Vincolo di esistenza label.
-        if isinstance(c, NodeLabelConstraint):
-            if c.label not in labels:
-                errors.append({"index": i, "field": "label",
-                               "message": f"Label '{c.label}' non presente nel grafo"})
-        # Vincolo di tipo di relazione tra due label.
-        elif isinstance(c, EdgeTypeConstraint):
-            if c.from_label not in labels:
-                errors.append({"index": i, "field": "from_label",
-                               "message": f"Label '{c.from_label}' non presente"})
-            if c.to_label not in labels:
-                errors.append({"index": i, "field": "to_label",
-                               "message": f"Label '{c.to_label}' non presente"})
-            if c.rel_type not in rel_types:
-                errors.append({"index": i, "field": "rel_type",
-                               "message": f"RelType '{c.rel_type}' non presente"})
+        check = _CHECKS.get(getattr(c, "type", None))
+        if check is not None:
+            check(i, c, labels, rel_types, errors)
     return {"ok": len(errors) == 0, "errors": errors}
+
+
+# Impronta di una lista di vincoli (modelli Pydantic).
+def _constraints_key(constraints: List[Constraint]) -> str:
+    normalized = [c.model_dump() for c in constraints]
+    raw = orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+#Come validate_constraints, riusando se presente il risultato in cache per
+#il database attivo.
+async def validate_constraints_cached(constraints: List[Constraint]) -> dict:
+    db = await run_in_threadpool(get_current_database_or_default)
+    key = (db, _constraints_key(constraints))
+
+    hit = _validation_cache.get(key)
+    if hit is None:
+        result = await validate_constraints(constraints, db)
+        hit = (result["ok"], tuple(result["errors"]))
+        _validation_cache.set(key, hit)
+
+    ok, errors = hit
+    return {"ok": ok, "errors": list(errors)}
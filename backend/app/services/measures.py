@@ -13,57 +13,270 @@ Il calcolo avviene interrogando direttamente il database attivo, senza
 presupporre che il grafo stia interamente in memoria.
 """
 
-from typing import List, Dict, Any, Set, Tuple
+import heapq
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from itertools import chain
+from typing import List, Dict, Any, FrozenSet, Set, Tuple
 
-from .rpq_syntax import parse_rpc
 from .rpq_inclusion import (
     validate_symbols,
-    pairs_for_sequence,
-    _expand_simple_parentheses,
+    violations_for_constraint,
+    has_violation,
+    parse_constraint,
+    RUNTIME_HINT,
+    _sequence_match,
 )
-from ..database.neo4j import get_session
+from ..database.neo4j import get_session, session_scope
 from ..database.manager import get_current_database_or_default
 
 
+# Thread per valutare più vincoli in parallelo: ogni valutazione è una
+# query indipendente (tempo speso in attesa di Neo4j, con il GIL
+# rilasciato) su una propria sessione presa dal pool del driver.
+_CONSTRAINT_WORKERS = 8
+_constraint_pool = ThreadPoolExecutor(
+    max_workers=_CONSTRAINT_WORKERS, thread_name_prefix="measures"
+)
 
-# Helper: trova 1 percorso testimone u -> v per una sequenza RPQ
-def one_witness_path_for_sequence(
-    seq, u_id: int, v_id: int
-) -> List[Tuple[int, int, str]]:
-    """
-    Restituisce un cammino u→…→v che rispetta esattamente la sequenza 'seq'.
-    Se non esiste, ritorna [].
-    """
 
-    # Per semplicità non gestiamo inverse
-    if any(inv for inv, _ in seq):
-        return []
+# Numero massimo di coppie (u, v) inviate in una singola query batch.
+_WITNESS_BATCH = 1000
+
+
+# Testo Cypher batch: per ogni coppia [u, v] della lista $pairs cerca un
+# solo cammino testimone della sequenza (subquery con LIMIT 1 per riga).
+@lru_cache(maxsize=256)
+def _witness_batch_query(seq: Tuple[Tuple[bool, str], ...]) -> str:
+    # Stesso frammento MATCH (già in cache) delle query sui vincoli, con
+    # i passi inversi percorsi al contrario.
+    match = _sequence_match(seq)
+
+    ids = ", ".join([f"id(n{i})" for i in range(len(seq) + 1)])
+
+    # Estremi legati per primi (ricerca per id), poi il cammino tra due
+    # nodi già noti: Neo4j può espandere "into" invece di filtrare a valle.
+    last = len(seq)
+    return f"""{RUNTIME_HINT}
+            UNWIND $pairs AS p
+            CALL {{
+                WITH p
+                MATCH (n0), (n{last})
+                WHERE id(n0) = p[0] AND id(n{last}) = p[1]
+                {match}
+                RETURN [{ids}] AS ids LIMIT 1
+            }}
+            RETURN p[0] AS u, p[1] AS v, ids
+        """
 
-    db = get_current_database_or_default()
 
-    with get_session(db) as s:
-        parts = ["(n0)"]
-        for i, (_, rel) in enumerate(seq):
-            parts.append(f"-[:`{rel}`]->(n{i+1})")
-        pattern = "".join(parts)
+# Helper: percorsi testimoni per più coppie con la stessa sequenza RPQ
+def witness_paths_batch(
+    seq, pairs: List[Tuple[int, int]], session=None
+) -> Dict[Tuple[int, int], List[Tuple[int, int, str]]]:
+    """
+    Percorsi testimoni per un insieme di coppie (u, v): una sola query
+    (UNWIND) ogni _WITNESS_BATCH coppie invece di una per coppia.
+    Ritorna {(u, v): cammino} solo per le coppie con un testimone.
+    La sequenza vuota (ε, da una stella) non dà cammini: ritorna {}.
+    """
 
-        ret = ", ".join([f"id(n{i}) AS n{i}" for i in range(len(seq) + 1)])
+    if not pairs or not seq:
+        return {}
 
-        query = f"""
-            MATCH {pattern}
-            WHERE id(n0) = $u AND id(n{len(seq)}) = $v
-            RETURN {ret} LIMIT 1
-        """
+    seq = tuple(map(tuple, seq))
+    query = _witness_batch_query(seq)
 
-        row = s.run(query, u=u_id, v=v_id).single()
-        if not row:
-            return []
+    # Ricostruzione lista archi di ciascun cammino testimone, leggendo i
+    # record in streaming e per posizione. Gli archi sono riportati nel
+    # loro verso reale: un passo inverso ^rel da n_i a n_i+1 è l'arco
+    # n_i+1 -[rel]-> n_i.
+    paths = {}
+    with session_scope(session) as s:
+        for start in range(0, len(pairs), _WITNESS_BATCH):
+            chunk = [list(p) for p in pairs[start:start + _WITNESS_BATCH]]
+            for u, v, ids in s.run(query, pairs=chunk):
+                paths[(u, v)] = [
+                    (ids[i + 1], ids[i], rel) if inv else (ids[i], ids[i + 1], rel)
+                    for i, (inv, rel) in enumerate(seq)
+                ]
+    return paths
 
-        # Ricostruzione lista archi del cammino testimone
-        return [
-            (row[f"n{i}"], row[f"n{i+1}"], rel)
-            for i, (_, rel) in enumerate(seq)
-        ]
+
+# Helper: trova 1 percorso testimone u -> v per una sequenza RPQ
+def one_witness_path_for_sequence(
+    seq, u_id: int, v_id: int, session=None
+) -> List[Tuple[int, int, str]]:
+    """
+    Restituisce un cammino u→…→v che rispetta esattamente la sequenza 'seq'.
+    Se non esiste, ritorna [].
+    Usa la stessa query batch di witness_paths_batch con una sola coppia,
+    così il testo Cypher (e il piano in Neo4j) è condiviso.
+    """
+    return witness_paths_batch(seq, [(u_id, v_id)], session).get((u_id, v_id), [])
+
+
+# Helper: un testimone per ogni coppia problematica.
+# Per ogni coppia le sequenze LHS vanno provate nell'ordine: a ogni giro si
+# raggruppano le coppie per la sequenza da provare e si esegue una query
+# batch per sequenza distinta; le coppie senza testimone passano alla
+# sequenza successiva.
+def witness_paths_for_violations(
+    violations_source, session=None
+) -> List[List[Tuple[int, int, str]]]:
+    # Sequenze candidate (senza duplicati, in ordine) per ciascuna coppia.
+    # La sequenza vuota non ha archi: non è un testimone e si salta, così
+    # la coppia prova le sequenze successive.
+    candidates = {
+        pair: list(dict.fromkeys(tuple(map(tuple, seq)) for seq in seqs if seq))
+        for pair, seqs in violations_source.items()
+    }
+    found: Dict[Tuple[int, int], List[Tuple[int, int, str]]] = {}
+    step = 0
+
+    while True:
+        groups: Dict[tuple, List[Tuple[int, int]]] = {}
+        for pair, seqs in candidates.items():
+            if pair not in found and step < len(seqs):
+                groups.setdefault(seqs[step], []).append(pair)
+        if not groups:
+            break
+
+        for seq, pairs in groups.items():
+            found.update(witness_paths_batch(seq, pairs, session))
+        step += 1
+
+    # Stesso ordine delle coppie in violations_source.
+    return [found[pair] for pair in violations_source if pair in found]
+
+
+# Marcatore di fine insieme nei nodi del trie.
+_END = object()
+
+
+# Indica se il trie contiene un insieme (come tupla ordinata) i cui elementi
+# compaiono tutti in `items`, anch'essa ordinata. Si seguono solo i rami
+# etichettati con elementi di `items`.
+def _trie_has_subset(node: dict, items: tuple, start: int = 0) -> bool:
+    if _END in node:
+        return True
+    for k in range(start, len(items)):
+        child = node.get(items[k])
+        if child is not None and _trie_has_subset(child, items, k + 1):
+            return True
+    return False
+
+
+# Helper: posizioni degli insiemi minimali, cioè senza un altro insieme
+# della lista che ne sia sottoinsieme stretto (i duplicati restano tutti).
+# Gli insiemi, come tuple ordinate, sono visitati per dimensione crescente:
+# un sottoinsieme stretto è sempre più piccolo, quindi basta cercare S nel
+# trie dei minimali dei gruppi precedenti.
+def _minimal_indices(sets: List[frozenset]) -> List[int]:
+    canon = [tuple(sorted(S)) for S in sets]
+    by_size: Dict[int, List[int]] = {}
+    for i, items in enumerate(canon):
+        by_size.setdefault(len(items), []).append(i)
+
+    trie: dict = {}
+    minimal = []
+
+    for size in sorted(by_size):
+        # Insiemi identici (percorsi ripetuti) sono cercati nel trie una
+        # sola volta: l'esito vale per tutte le loro posizioni.
+        verdict: Dict[tuple, bool] = {}
+        group = []
+        for i in by_size[size]:
+            items = canon[i]
+            is_minimal = verdict.get(items)
+            if is_minimal is None:
+                is_minimal = verdict[items] = not _trie_has_subset(trie, items)
+            if is_minimal:
+                group.append(i)
+
+        # I minimali di questa dimensione entrano nel trie solo ora:
+        # insiemi della stessa dimensione non sono mai sottoinsiemi stretti.
+        for items, is_minimal in verdict.items():
+            if is_minimal:
+                node = trie
+                for e in items:
+                    node = node.setdefault(e, {})
+                node[_END] = True
+        minimal.extend(group)
+
+    return sorted(minimal)
+
+
+# Helper: vertex cover greedy delle coppie problematiche.
+# A ogni passo si rimuove il vertice che copre più coppie rimaste. I gradi
+# sono aggiornati in modo incrementale (solo i vicini del vertice rimosso)
+# e il massimo si estrae da un heap con cancellazione "pigra": le voci il
+# cui grado non è più attuale vengono scartate all'estrazione. Anche le
+# coppie coperte non vengono tolte da nessun insieme: basta spegnerne il
+# flag in `active`, indicizzato per posizione.
+def _greedy_vertex_cover(pairs: Set[Tuple[int, int]]) -> Set[int]:
+    pair_list = list(pairs)
+    active = bytearray(b"\x01") * len(pair_list)
+    # Gradi iniziali contati in blocco (Counter, in C) sugli estremi.
+    freq: Dict[int, int] = Counter(chain.from_iterable(pair_list))
+    by_vertex: Dict[int, List[int]] = {}
+    for i, (u, v) in enumerate(pair_list):
+        by_vertex.setdefault(u, []).append(i)
+        if v != u:
+            by_vertex.setdefault(v, []).append(i)
+
+    heap = [(-c, v) for v, c in freq.items()]
+    heapq.heapify(heap)
+    removed: Set[int] = set()
+
+    while heap:
+        neg, v_star = heapq.heappop(heap)
+        # In cima un grado nullo: nessuna coppia resta da coprire e le voci
+        # rimaste sono solo scadute, inutile estrarle una a una.
+        if neg == 0:
+            break
+        if v_star in removed or -neg != freq[v_star] or freq[v_star] == 0:
+            continue
+        removed.add(v_star)
+
+        # Le coppie ancora attive coperte da v_star escono: si aggiornano
+        # solo gli altri estremi, in O(grado di v_star).
+        for i in by_vertex.pop(v_star):
+            if not active[i]:
+                continue
+            active[i] = 0
+            u, v = pair_list[i]
+            x = v if u == v_star else u
+            if x != v_star:
+                freq[x] -= 1
+                heapq.heappush(heap, (-freq[x], x))
+        freq[v_star] = 0
+
+    return removed
+
+
+# Valuta i vincoli `valid` di `parsed` con `evaluate` e ritorna
+# {indice: risultato}. Il primo vincolo usa la sessione della richiesta,
+# gli altri girano nel pool, ciascuno su una propria sessione. Se una
+# valutazione fallisce, quelle non ancora partite vengono annullate e si
+# attende la fine di quelle in corso: nessuna query resta attiva (con la
+# sua connessione) oltre la richiesta.
+def _evaluate_parallel(evaluate, parsed, valid: List[int], session, db: str) -> Dict[int, Any]:
+    first, rest = valid[0], valid[1:]
+    futures = {
+        i: _constraint_pool.submit(evaluate, parsed[i][1], parsed[i][2], None, db)
+        for i in rest
+    }
+    try:
+        results = {first: evaluate(parsed[first][1], parsed[first][2], session, db)}
+        for i, f in futures.items():
+            results[i] = f.result()
+        return results
+    finally:
+        for f in futures.values():
+            f.cancel()
+        wait(futures.values())
 
 
 # Funzione principale: calcola tutte le misure di inconsistenza
@@ -74,16 +287,27 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
     e evitando calcoli superflui.
     """
 
-    requested = set(requested_measures or [])
+    # Una sola sessione (e una sola connessione dal pool) per tutte le
+    # query della richiesta, sul database attivo letto una sola volta e
+    # passato esplicitamente agli helper.
+    db = get_current_database_or_default()
+    with get_session(db) as s:
+        return _compute_measures(constraints, requested_measures, s, db)
+
+
+# Corpo di compute_measures, con la sessione condivisa da tutte le query
+# e il database `db` su cui è aperta.
+def _compute_measures(constraints: List[str], requested_measures: List[str], session, db: str) -> Dict[str, Any]:
+    requested: Set[str] = set(requested_measures or [])
 
     # 1) ANALISI DEI VINCOLI: coppie problematiche per ogni vincolo
     all_problem_pairs: Set[Tuple[int, int]] = set()
     violated_count = 0
-    per_constraint = []
+    per_constraint: List[Dict[str, Any]] = []
 
     # Mappa fondamentale: quali sequenze LHS hanno generato quali violazioni
     # (u,v) → [seq1, seq2, ...]
-    violations_source = {}
+    violations_source: Dict[Tuple[int, int], List[tuple]] = {}
 
     need_pairs = any(m in requested for m in [
         "problematic_pairs", "minimal_problematic_graphs", "minimal_problematic_paths",
@@ -91,12 +315,28 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
         "I_E_minus", "I_E_plus", "I_V_minus"
     ])
 
-    for raw in constraints:
-        raw_expanded = _expand_simple_parentheses(raw)
-        name, lhs_alts, rhs_alts = parse_rpc(raw_expanded)
+    # Se servono solo mu_drastic / mu_violated_constraints basta sapere
+    # quali vincoli hanno almeno una violazione (query con LIMIT 1); con il
+    # solo mu_drastic ci si ferma alla prima violazione trovata.
+    exists_only = bool(requested) and requested <= {"mu_drastic", "mu_violated_constraints"}
+    stop_at_first = requested == {"mu_drastic"}
+    evaluate = has_violation if exists_only else violations_for_constraint
 
+    parsed = []
+    for raw in constraints:
+        name, lhs_alts, rhs_alts = parse_constraint(raw)
+        parsed.append((name, lhs_alts, rhs_alts, validate_symbols(lhs_alts, rhs_alts)))
+
+    # Con più vincoli da valutare (e senza arresto alla prima violazione)
+    # le query partono subito in parallelo; il ciclo sotto usa i risultati
+    # nell'ordine originale.
+    results: Dict[int, Any] = {}
+    valid = [i for i, (*_, errors) in enumerate(parsed) if not errors]
+    if not stop_at_first and len(valid) > 1:
+        results = _evaluate_parallel(evaluate, parsed, valid, session, db)
+
+    for i, (name, lhs_alts, rhs_alts, errors) in enumerate(parsed):
         # Errore nei simboli → vincolo violato
-        errors = validate_symbols(lhs_alts, rhs_alts)
         if errors:
             violated_count += 1
             per_constraint.append({
@@ -105,18 +345,31 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
                 "type": "schema_validation",
                 "errors": errors,
             })
+            if stop_at_first:
+                break
             continue
 
-        # Calcolo coppie raggiungibili LHS e RHS
-        lhs_pairs = set()
-        for seq in lhs_alts:
-            lhs_pairs |= pairs_for_sequence(seq)
-
-        rhs_pairs = set()
-        for seq in rhs_alts:
-            rhs_pairs |= pairs_for_sequence(seq)
+        if exists_only:
+            if i in results:
+                ok = not results[i]
+            else:
+                ok = not has_violation(lhs_alts, rhs_alts, session, db)
+            per_constraint.append({"name": name, "ok": ok})
+            if not ok:
+                violated_count += 1
+                if stop_at_first:
+                    break
+            continue
 
-        violations = lhs_pairs - rhs_pairs
+        # Violazioni LHS \ RHS calcolate da Neo4j (una sola query per il
+        # vincolo, in cache per database): tornano solo le cardinalità e le
+        # coppie violate.
+        if i in results:
+            lhs_count, rhs_count, violations = results[i]
+        else:
+            lhs_count, rhs_count, violations = violations_for_constraint(
+                lhs_alts, rhs_alts, session, db
+            )
         ok = len(violations) == 0
 
         if not ok:
@@ -132,13 +385,13 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
         per_constraint.append({
             "name": name,
             "ok": ok,
-            "lhs_pairs": len(lhs_pairs),
-            "rhs_pairs": len(rhs_pairs),
+            "lhs_pairs": lhs_count,
+            "rhs_pairs": rhs_count,
             "violations_count": len(violations),
         })
 
     # 2) MISURE SEMPLICI (non richiedono percorsi)
-    summary = {}
+    summary: Dict[str, int] = {}
 
     if "mu_drastic" in requested:
         summary["mu_drastic"] = 1 if violated_count > 0 else 0
@@ -157,23 +410,22 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
         }
 
     # 3) CALCOLO WITNESS PATH (solo per le coppie e sequenze LHS rilevanti)
-    all_witness_paths = []
-    for (u, v), seqs in violations_source.items():
-        for seq in seqs:
-            path = one_witness_path_for_sequence(seq, u, v)
-            if path:
-                all_witness_paths.append(path)
-                break  # basta un testimone per questa coppia
+    # Un testimone per coppia, con query batch per sequenza invece di una
+    # query per ogni coppia.
+    all_witness_paths = witness_paths_for_violations(violations_source, session)
+
+    # Forma canonica dei percorsi, calcolata una sola volta: tupla (per i
+    # percorsi minimali) e frozenset degli archi (per minimalità e archi).
+    path_tuples: List[Tuple[Tuple[int, int, str], ...]] = [tuple(p) for p in all_witness_paths]
+    path_sets: List[FrozenSet[Tuple[int, int, str]]] = [frozenset(p) for p in path_tuples]
 
     # 4) MIMS (minimal problematic graphs)
     if "minimal_problematic_graphs" in requested or "I_E_minus" in requested:
 
-        path_sets = [frozenset(p) for p in all_witness_paths if p]
-        minimal_sets = []
-
-        for i, S in enumerate(path_sets):
-            if not any(T < S for j, T in enumerate(path_sets) if i != j):
-                minimal_sets.append(S)
+        # Sottografi distinti: percorsi con gli stessi archi (testimoni di
+        # coppie diverse, es. i due versi di un ciclo) contano una volta.
+        nonempty_sets = [P for P in dict.fromkeys(path_sets) if P]
+        minimal_sets = [nonempty_sets[i] for i in _minimal_indices(nonempty_sets)]
 
         if "minimal_problematic_graphs" in requested:
             summary["minimal_problematic_graphs"] = len(minimal_sets)
@@ -184,25 +436,12 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
     # 5) Minimal problematic paths I_S(G)
     if "minimal_problematic_paths" in requested:
 
-        path_list = [tuple(p) for p in all_witness_paths]
-        minimal_paths = []
-
-        for i, P in enumerate(path_list):
-            setP = set(P)
-            smaller_exists = any(
-                set(Q) < setP
-                for j, Q in enumerate(path_list)
-                if i != j
-            )
-            if not smaller_exists:
-                minimal_paths.append(P)
+        minimal_paths = [path_tuples[i] for i in _minimal_indices(path_sets)]
 
         summary["minimal_problematic_paths"] = len(minimal_paths)
 
     # 6) ARCHI, LABEL, NODI PROBLEMATICI
-    prob_edges = set()
-    for p in all_witness_paths:
-        prob_edges |= set(p)
+    prob_edges: FrozenSet[Tuple[int, int, str]] = frozenset().union(*path_sets)
 
     if "problematic_edges" in requested:
         summary["problematic_edges"] = len(prob_edges)
@@ -220,26 +459,7 @@ def compute_measures(constraints: List[str], requested_measures: List[str]) -> D
 
     # 8) I(V−): vertex cover approssimato
     if "I_V_minus" in requested:
-
-        freq = {}
-        for u, v in all_problem_pairs:
-            freq[u] = freq.get(u, 0) + 1
-            freq[v] = freq.get(v, 0) + 1
-
-        pairs_left = set(all_problem_pairs)
-        removed = set()
-
-        while pairs_left and freq:
-            v_star = max(freq, key=freq.get)
-            removed.add(v_star)
-
-            pairs_left = {(a, b) for (a, b) in pairs_left if a != v_star and b != v_star}
-
-            freq = {}
-            for a, b in pairs_left:
-                freq[a] = freq.get(a, 0) + 1
-                freq[b] = freq.get(b, 0) + 1
-
+        removed = _greedy_vertex_cover(all_problem_pairs)
         summary["I_V_minus"] = len(removed)
 
     # OUTPUT FINALE
@@ -9,24 +9,32 @@ sul database attivo.
 """
 
 
-from typing import Set, Tuple
+from functools import lru_cache
+from typing import Tuple
 import re
 
-from ..database.neo4j import get_session
-from ..config import get_settings
+from ..database.neo4j import session_scope
 from .rpq_syntax import parse_rpc
 from ..database.manager import get_current_database_or_default
+from ..cache import TTLCache
+from ..config import get_settings
 
 
-'''def load_rel_types() -> Set[str]:
-    s = get_settings()
-    with get_session(get_current_database_or_default()) as session:
-        return {
-            r["type"]
-            for r in session.run(
-                "CALL db.relationshipTypes() YIELD relationshipType AS type RETURN type"
-            )
-        }'''
+# Prefisso "CYPHER runtime=..." per tutte le query RPQ, se configurato
+# (NEO4J_CYPHER_RUNTIME): evita che Neo4j ripieghi su un runtime più lento.
+_runtime = get_settings().NEO4J_CYPHER_RUNTIME
+RUNTIME_HINT = f"CYPHER runtime={_runtime}\n" if _runtime else ""
+
+
+# Risultati delle valutazioni (per database e vincolo) riutilizzati per 30
+# secondi: la stessa lista di vincoli viene spesso reinviata per misure
+# diverse. Svuotabile con clear_rpq_cache().
+_results_cache = TTLCache(maxsize=256, ttl=30)
+
+
+#Svuota la cache dei risultati RPQ (es. dopo una modifica dei dati).
+def clear_rpq_cache():
+    _results_cache.clear()
 
 
 def validate_symbols(lhs_alts, rhs_alts):
@@ -46,6 +54,17 @@ def validate_symbols(lhs_alts, rhs_alts):
     return errors
 
 
+# pattern: prefisso (eventualmente con altri '.') seguito da .(A∣B)
+# (ogni simbolo può avere il prefisso ^ di relazione inversa)
+_EXPAND_RE = re.compile(r'(\^?[\w_]+(?:\.\^?[\w_]+)*)\.\((\^?[\w_]+)\s*∣\s*(\^?[\w_]+)\)')
+
+
+# prefisso.(A∣B) → prefisso.A∣prefisso.B
+def _expand_match(m: "re.Match") -> str:
+    prefix, opt1, opt2 = m.groups()  # es. "child_of" o "r1.r2"
+    return f"{prefix}.{opt1}∣{prefix}.{opt2}"
+
+
 # --------------------------------------------------------
 # Espansione semplice delle parentesi nella forma:
 #   X.(A|B) oppure X.(A∣B)
@@ -58,41 +77,25 @@ def _expand_simple_parentheses(constraint_str: str) -> str:
     diventa
       'C2=child_of.brother_of∣child_of.sister_of⊆nephew_of∣niece_of'
     """
-    s = constraint_str
-
     # normalizza l'operatore di unione a '∣'
-    s = s.replace("|", "∣")
-
-    # pattern: prefisso (eventualmente con altri '.') seguito da .(A∣B)
-    pattern = re.compile(
-        r'([\w_]+(?:\.[\w_]+)*)\.\(([\w_]+)\s*∣\s*([\w_]+)\)'
-    )
-
-    while True:
-        m = pattern.search(s)
-        if not m:
-            break
-
-        prefix = m.group(1)  # es. "child_of" o "r1.r2"
-        opt1 = m.group(2)
-        opt2 = m.group(3)
+    s = constraint_str.replace("|", "∣")
 
-        replacement = f"{prefix}.{opt1}∣{prefix}.{opt2}"
-        s = s[:m.start()] + replacement + s[m.end():]
+    # Si espande sempre l'occorrenza più a sinistra e si riparte: in
+    # P.(A∣B).Q.(C∣D) il prefisso della seconda diventa P.B.Q solo dopo la
+    # prima espansione, quindi una sola sub() su tutte non basterebbe.
+    prev = None
+    while prev != s:
+        prev = s
+        s = _EXPAND_RE.sub(_expand_match, s, count=1)
 
     return s
 
 
-def pairs_for_sequence(seq):
-    """
-    Restituisce tutte le coppie (u,v) tali che esiste un cammino
-    u --R1--> x1 --R2--> x2 ... --Rn--> v
-    per la sequenza 'seq'.
-
-    seq = [(inv, 'rel1'), (inv, 'rel2'), ...]
-    """
-    db = get_current_database_or_default()
-
+# Clausola MATCH del cammino n0 → … → nk per una sequenza di relazioni.
+# I frammenti sono in cache: le query delle violazioni, di esistenza e dei
+# testimoni riusano lo stesso testo già costruito per ogni sequenza.
+@lru_cache(maxsize=512)
+def _sequence_match(seq: Tuple[Tuple[bool, str], ...]) -> str:
     # costruzione del pattern MATCH
     pattern = "(n0)"
     for i, (inv, rel) in enumerate(seq):
@@ -100,26 +103,151 @@ def pairs_for_sequence(seq):
             pattern += f"<-[:`{rel}`]-(n{i+1})"
         else:
             pattern += f"-[:`{rel}`]->(n{i+1})"
+    return f"MATCH {pattern}"
 
-    query_text = f"""
-        MATCH {pattern}
-        RETURN DISTINCT id(n0) AS u, id(n{len(seq)}) AS v
-    """
 
-    out: Set[Tuple[int, int]] = set()
-    with get_session(db) as s:
-        for row in s.run(query_text):
-            out.add((row["u"], row["v"]))
+# Pattern della sequenza tra due nodi già legati `a` e `b` (nodi intermedi
+# anonimi), da usare dentro EXISTS { ... }.
+@lru_cache(maxsize=512)
+def _anchored_pattern(seq: Tuple[Tuple[bool, str], ...]) -> str:
+    pattern = "(a)"
+    for i, (inv, rel) in enumerate(seq):
+        node = "(b)" if i == len(seq) - 1 else "()"
+        if inv:
+            pattern += f"<-[:`{rel}`]-{node}"
+        else:
+            pattern += f"-[:`{rel}`]->{node}"
+    return pattern
+
+
+# Condizione Cypher "la coppia (a, b) è prodotta da una delle alternative
+# RHS". La sequenza vuota (epsilon, generata dallo star) è la relazione
+# identità e diventa il confronto a = b: EXISTS { (a) } sarebbe sempre vero.
+@lru_cache(maxsize=256)
+def _covered_predicate(rhs) -> str:
+    return " OR ".join(
+        f"EXISTS {{ {_anchored_pattern(seq)} }}" if seq else "a = b"
+        for seq in rhs
+    ) or "false"
+
+
+# Testo Cypher che calcola le violazioni LHS \ RHS direttamente in Neo4j:
+# per ogni coppia (a, b) prodotta dalla LHS si verifica con EXISTS se una
+# alternativa RHS collega gli stessi nodi. Tornano solo le cardinalità dei
+# due lati e le coppie violate, non gli insiemi completi.
+@lru_cache(maxsize=256)
+def _violations_query(lhs, rhs) -> str:
+    if rhs:
+        rhs_union = "\n        UNION\n        ".join(
+            f"{_sequence_match(seq)} RETURN n0 AS a, n{len(seq)} AS b" for seq in rhs
+        )
+        rhs_count = f"CALL {{\n        {rhs_union}\n    }}\n    RETURN count(*) AS rhs_count"
+    else:
+        rhs_count = "RETURN 0 AS rhs_count"
+    covered = _covered_predicate(rhs)
+
+    if lhs:
+        lhs_union = "\n        UNION\n        ".join(
+            f"{_sequence_match(seq)} RETURN n0 AS a, n{len(seq)} AS b" for seq in lhs
+        )
+        lhs_part = f"""CALL {{
+        {lhs_union}
+    }}
+    WITH a, b, {covered} AS covered
+    RETURN count(*) AS lhs_count,
+           collect(CASE WHEN covered THEN null ELSE [id(a), id(b)] END) AS violations"""
+    else:
+        lhs_part = "RETURN 0 AS lhs_count, [] AS violations"
+
+    return f"""{RUNTIME_HINT}
+CALL {{
+    {rhs_count}
+}}
+CALL {{
+    {lhs_part}
+}}
+RETURN lhs_count, rhs_count, violations
+"""
+
+
+# Testo Cypher che verifica soltanto se esiste almeno una violazione:
+# Neo4j si ferma alla prima coppia LHS non coperta dalla RHS (LIMIT 1).
+@lru_cache(maxsize=256)
+def _violation_exists_query(lhs, rhs) -> str:
+    lhs_union = "\n    UNION\n    ".join(
+        f"{_sequence_match(seq)} RETURN n0 AS a, n{len(seq)} AS b" for seq in lhs
+    )
+    return f"""{RUNTIME_HINT}
+CALL {{
+    {lhs_union}
+}}
+WITH a, b WHERE NOT ({_covered_predicate(rhs)})
+RETURN id(a) AS u, id(b) AS v LIMIT 1
+"""
+
+
+# Vero se il linguaggio della LHS è contenuto in quello della RHS. Le
+# alternative sono insiemi finiti di parole (lo star è espanso per un
+# numero limitato di ripetizioni), quindi basta un confronto tra insiemi
+# senza costruire automi.
+@lru_cache(maxsize=1024)
+def _language_included(lhs, rhs) -> bool:
+    return set(lhs) <= set(rhs)
 
-    return out
 
+#Indica se il vincolo ha almeno una violazione, senza enumerarle tutte.
+#Se il risultato completo è già in cache viene riutilizzato.
+#`db` è il database della sessione: se non indicato si usa quello attivo.
+def has_violation(lhs_alts, rhs_alts, session=None, db: str = None) -> bool:
+    lhs_key = tuple(tuple(map(tuple, seq)) for seq in lhs_alts)
+    rhs_key = tuple(tuple(map(tuple, seq)) for seq in rhs_alts)
+    if not lhs_key:
+        return False
 
-#Calcola l’unione delle coppie prodotte da più alternative RPQ.
-def pairs_for_alts(alts) -> Set[Tuple[int, int]]:
-    out: Set[Tuple[int, int]] = set()
-    for seq in alts:
-        out |= pairs_for_sequence(seq)
-    return out
+    # Inclusione sintattica: se ogni sequenza LHS compare anche tra le
+    # alternative RHS, ogni cammino LHS è anche un cammino RHS e il vincolo
+    # vale su qualsiasi grafo, senza interrogare Neo4j.
+    if _language_included(lhs_key, rhs_key):
+        return False
+
+    db = db or get_current_database_or_default()
+    full = _results_cache.get(("violations", db, lhs_key, rhs_key))
+    if full is not None:
+        return len(full[2]) > 0
+
+    def fetch():
+        with session_scope(session, db) as s:
+            return s.run(_violation_exists_query(lhs_key, rhs_key)).single() is not None
+
+    return _results_cache.get_or_set(("exists", db, lhs_key, rhs_key), fetch)
+
+
+#Calcola in Neo4j, con una sola query, le violazioni LHS \ RHS di un
+#vincolo. Ritorna (|LHS|, |RHS|, insieme delle coppie violate).
+#Il risultato resta in cache per database (`db`, di default quello attivo)
+#e vincolo.
+def violations_for_constraint(lhs_alts, rhs_alts, session=None, db: str = None):
+    lhs_key = tuple(tuple(map(tuple, seq)) for seq in lhs_alts)
+    rhs_key = tuple(tuple(map(tuple, seq)) for seq in rhs_alts)
+    db = db or get_current_database_or_default()
+    key = ("violations", db, lhs_key, rhs_key)
+
+    def fetch():
+        with session_scope(session, db) as s:
+            lhs_count, rhs_count, violations = s.run(_violations_query(lhs_key, rhs_key)).single()
+        return lhs_count, rhs_count, frozenset(map(tuple, violations))
+
+    return _results_cache.get_or_set(key, fetch)
+
+
+#Espande e analizza un vincolo RPC, con il risultato in cache.
+#Le alternative sono restituite come tuple (immutabili e hashabili), così
+#da poter essere condivise tra richieste e usate come chiavi di cache.
+@lru_cache(maxsize=1024)
+def parse_constraint(constraint_str: str):
+    name, lhs, rhs = parse_rpc(_expand_simple_parentheses(constraint_str))
+    # Le sequenze sono già tuple: basta congelare le liste di alternative.
+    return name, tuple(lhs), tuple(rhs)
 
 
 def check_inclusion(constraint_str: str) -> dict:
@@ -135,11 +263,8 @@ def check_inclusion(constraint_str: str) -> dict:
       - violations: lista delle coppie che violano l’inclusione
       - violations_count
     """
-    # Espansione X.(A∣B)
-    expanded = _expand_simple_parentheses(constraint_str)
-
-    # 1) parsing rigoroso RPC
-    name, lhs, rhs = parse_rpc(expanded)  # se non è RPC, ValueError
+    # Espansione X.(A∣B) e parsing rigoroso RPC (in cache)
+    name, lhs, rhs = parse_constraint(constraint_str)  # se non è RPC, ValueError
 
     # 2) validazione sintattica dei simboli
     schema_errors = validate_symbols(lhs, rhs)
@@ -151,16 +276,19 @@ def check_inclusion(constraint_str: str) -> dict:
             "name": name,
         }
 
-    # 3) valutazione insiemistica LHS⊆RHS
-    lhs_pairs = pairs_for_alts(lhs)
-    rhs_pairs = pairs_for_alts(rhs)
-    violations = sorted(list(lhs_pairs - rhs_pairs))
+    # 3) valutazione insiemistica LHS⊆RHS sul database attivo: una sola
+    # query calcola in Neo4j le cardinalità dei due lati e le coppie
+    # violate (in cache per database e vincolo); qui restano solo
+    # l'ordinamento e le prime 200 coppie.
+    lhs_count, rhs_count, violation_set = violations_for_constraint(lhs, rhs)
+    violations_count = len(violation_set)
+    violations = sorted(violation_set)[:200]
 
     return {
-        "ok": len(violations) == 0,
+        "ok": violations_count == 0,
         "name": name,
-        "lhs_pairs": len(lhs_pairs),
-        "rhs_pairs": len(rhs_pairs),
-        "violations": violations[:200],
-        "violations_count": len(violations),
+        "lhs_pairs": lhs_count,
+        "rhs_pairs": rhs_count,
+        "violations": violations,
+        "violations_count": violations_count,
     }
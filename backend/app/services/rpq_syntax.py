@@ -7,113 +7,115 @@ Il modulo fornisce:
 - il parsing completo di un vincolo RPC (nome, LHS, RHS),
 - il supporto alla concatenazione implicita e agli operatori OR,
 - il supporto all’operatore Kleene star *,
+- il supporto alle relazioni inverse con il prefisso ^ (es. ^child_of),
 - controlli sintattici di base.
 
 Le RPQ risultano rappresentate come sequenze di coppie (inv, label),
 mentre un vincolo RPC è scomposto nelle due parti LHS ⊆ RHS.
 """
 
-from typing import List, Tuple
+import re
+import sys
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+from ..config import get_settings
 
 # Ogni simbolo atomico è una coppia (inv, label)
 # inv: bool (False = direzione normale, True = inversa)
 # label: str (es. "child_of")
 Atom = Tuple[bool, str]
 
+# Una sequenza di simboli è una tupla: concatenarne due è una sola copia
+# in C e le sequenze sono hashabili (deduplicazione, chiavi di cache).
+Seq = Tuple[Atom, ...]
+
 
 # TOKENIZER
 
 Token = Tuple[str, str]  # (kind, value)
 
 
-def _tokenize(expr: str) -> List[Token]:
+# Scanner dei token: un'unica regex con un gruppo per tipo, percorsa con
+# finditer. Lo spazio è scartato, ';' chiude l'espressione e ERR cattura
+# qualsiasi altro carattere non valido.
+_TOKEN_RE = re.compile(
+    r"(?P<WS>\s+)|(?P<SEMI>;)|(?P<LPAREN>\()|(?P<RPAREN>\))"
+    r"|(?P<OR>[|∣])|(?P<DOT>\.)|(?P<STAR>\*)|(?P<INV>\^)|(?P<IDENT>[^\W\d]\w*)|(?P<ERR>.)",
+    re.DOTALL,
+)
+
+# L'OR '∣' è normalizzato a '|'
+_TOKEN_VALUES = {"OR": "|"}
+
+# Nomi dei tipi di token internati: sono gli stessi oggetti delle costanti
+# "OR", "DOT", ... usate dal parser, e i confronti kind == "OR" si
+# risolvono per identità (i nomi restituiti dalla regex sono copie).
+_KINDS = {name: sys.intern(name) for name in _TOKEN_RE.groupindex}
+
+# Token restituito a flusso esaurito
+_EOF: Token = ("EOF", "")
+
+
+def _tokenize(expr: str) -> Iterator[Token]:
     """
-    Trasforma una stringa RPQ in una lista di token.
+    Trasforma una stringa RPQ in un flusso di token, prodotti man mano
+    che il parser li consuma (senza lista intermedia).
     Supporta:
       - parentesi: ( )
       - OR: |  (anche '∣' normalizzato a '|')
       - concatenazione: '.' o implicita
       - Kleene star: *
+      - inversa: ^ davanti a un identificatore
       - identificatori: child_of, grandson_of, ecc.
       - ignora eventuale ';' finale
     """
-    expr = expr.strip()
-    tokens: List[Token] = []
-    i = 0
-    n = len(expr)
-
-    while i < n:
-        ch = expr[i]
-
-        if ch.isspace():
-            i += 1
+    for m in _TOKEN_RE.finditer(expr.strip()):
+        kind = m.lastgroup
+        if kind == "WS":
             continue
-
-        if ch == ';':
+        if kind == "SEMI":
             break
 
-        if ch == '(':
-            tokens.append(("LPAREN", ch))
-            i += 1
-            continue
+        value = m.group()
+        # Un identificatore inizia con una lettera o '_' (non con cifre
+        # "numeriche" come '²', che \w accetterebbe).
+        if kind == "ERR" or (kind == "IDENT" and not (value[0].isalpha() or value[0] == "_")):
+            raise ValueError(f"Carattere non valido nella RPQ: '{value[0]}'")
 
-        if ch == ')':
-            tokens.append(("RPAREN", ch))
-            i += 1
-            continue
+        yield _KINDS[kind], _TOKEN_VALUES.get(kind, value)
 
-        if ch == '|' or ch == '∣':
-            tokens.append(("OR", "|"))
-            i += 1
-            continue
 
-        if ch == '.':
-            tokens.append(("DOT", "."))
-            i += 1
-            continue
-
-        if ch == '*':
-            tokens.append(("STAR", "*"))
-            i += 1
-            continue
-
-        # identificatore
-        if ch.isalpha() or ch == '_':
-            start = i
-            i += 1
-            while i < n and (expr[i].isalnum() or expr[i] == '_'):
-                i += 1
-            ident = expr[start:i]
-            tokens.append(("IDENT", ident))
-            continue
-
-        raise ValueError(f"Carattere non valido nella RPQ: '{ch}'")
+# PARSER RPQ
 
-    tokens.append(("EOF", ""))
-    return tokens
+# Token che possono chiudere una RPQ e token che iniziano un fattore
+# (concatenazione implicita)
+_RPQ_END = frozenset(("EOF", "RPAREN"))
+_CONCAT_FOLLOW = frozenset(("IDENT", "INV", "LPAREN"))
 
 
-# PARSER RPQ
 class _RPQParser:
     """
     Parser ricorsivo per un'espressione RPQ.
 
     Restituisce una lista di alternative:
-        List[List[Atom]]
+        List[Seq]
 
-    dove ogni alternativa è una sequenza di (inv, label).
+    dove ogni alternativa è una tupla di (inv, label).
     """
 
-    def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
-        self.pos = 0
+    # Il parser legge un token alla volta dal flusso; a flusso esaurito
+    # il token corrente resta EOF.
+    def __init__(self, tokens: Iterator[Token]):
+        self._tokens = tokens
+        self._cur = next(tokens, _EOF)
 
     def _peek(self) -> Token:
-        return self.tokens[self.pos]
+        return self._cur
 
     def _advance(self) -> Token:
-        tok = self.tokens[self.pos]
-        self.pos += 1
+        tok = self._cur
+        self._cur = next(self._tokens, _EOF)
         return tok
 
     def _expect(self, kind: str) -> Token:
@@ -123,24 +125,29 @@ class _RPQParser:
         return self._advance()
 
     # RPQ := ALT
-    def parse_rpq(self) -> List[List[Atom]]:
+    def parse_rpq(self) -> List[Seq]:
         alts = self._parse_alt()
-        if self._peek()[0] not in ("EOF", "RPAREN"):
+        if self._peek()[0] not in _RPQ_END:
             kind, val = self._peek()
             raise ValueError(f"Token inatteso '{val}' ({kind}) alla fine della RPQ")
+        # Il resto del flusso (dopo una ')' finale) va comunque scandito,
+        # così un carattere non valido in coda viene segnalato.
+        for _ in self._tokens:
+            pass
         return alts
 
     # ALT := CONCAT ( 'OR' CONCAT )*
-    def _parse_alt(self) -> List[List[Atom]]:
+    def _parse_alt(self) -> List[Seq]:
         alts = self._parse_concat()
         while self._peek()[0] == "OR":
             self._advance()
             right = self._parse_concat()
             alts.extend(right)
-        return alts
+        # Alternative ripetute (es. a|a) tenute una volta sola, in ordine
+        return list(dict.fromkeys(alts))
 
     # CONCAT := FACTOR ( (DOT)? FACTOR )*
-    def _parse_concat(self) -> List[List[Atom]]:
+    def _parse_concat(self) -> List[Seq]:
         alts = self._parse_factor()
 
         while True:
@@ -151,7 +158,7 @@ class _RPQParser:
                 rhs = self._parse_factor()
                 alts = self._concat_alts(alts, rhs)
 
-            elif kind in ("IDENT", "LPAREN"):
+            elif kind in _CONCAT_FOLLOW:
                 # concatenazione implicita
                 rhs = self._parse_factor()
                 alts = self._concat_alts(alts, rhs)
@@ -162,7 +169,7 @@ class _RPQParser:
         return alts
 
     # FACTOR := BASE ('STAR')?
-    def _parse_factor(self) -> List[List[Atom]]:
+    def _parse_factor(self) -> List[Seq]:
         base = self._parse_base()
 
         if self._peek()[0] == "STAR":
@@ -171,74 +178,104 @@ class _RPQParser:
 
         return base
 
-    # BASE := IDENT | '(' ALT ')'
-    def _parse_base(self) -> List[List[Atom]]:
+    # BASE := ('INV')? IDENT | '(' ALT ')'
+    def _parse_base(self) -> List[Seq]:
         kind, val = self._peek()
 
-        if kind == "IDENT":
+        inv = kind == "INV"
+        if inv:
             self._advance()
-            return [[(False, val)]]
+            kind, val = self._expect("IDENT")
+
+        if kind == "IDENT":
+            if not inv:
+                self._advance()
+            # Etichetta internata: lo stesso nome di relazione è un unico
+            # oggetto in tutti i vincoli e i percorsi, e i confronti tra
+            # archi si risolvono per identità senza confrontare i caratteri.
+            return [((inv, sys.intern(val)),)]
 
         if kind == "LPAREN":
             self._advance()
             inner = self._parse_alt()
-            self._expect("RPAREN")
+            # _expect("RPAREN") in linea: è il punto di chiamata più
+            # frequente, a ogni gruppo tra parentesi.
+            if self._cur[0] != "RPAREN":
+                raise ValueError(f"Atteso token RPAREN ma trovato {self._cur[0]}")
+            self._cur = next(self._tokens, _EOF)
             return inner
 
         raise ValueError(f"Token inatteso '{val}' ({kind}) in fattore RPQ")
 
     @staticmethod
     def _concat_alts(
-        left: List[List[Atom]],
-        right: List[List[Atom]]
-    ) -> List[List[Atom]]:
+        left: List[Seq],
+        right: List[Seq]
+    ) -> List[Seq]:
         if not left:
             return right
         if not right:
             return left
-        out: List[List[Atom]] = []
-        for a in left:
-            for b in right:
-                out.append(a + b)
-        return out
+        # Senza duplicati (es. (a|a).b), così le concatenazioni successive
+        # e le query generate non crescono per alternative identiche.
+        return list(dict.fromkeys(a + b for a in left for b in right))
 
-    def _kleene_star(self, alts: List[List[Atom]], max_repeat: int = 3) -> List[List[Atom]]:
+    def _kleene_star(self, alts: List[Seq], max_repeat: Optional[int] = None) -> List[Seq]:
         """
         Kleene star finito:
          - epsilon
          - alts
          - alts.alts
          - alts.alts.alts
-        fino a max_repeat iterazioni
+        fino a max_repeat iterazioni (di default RPQ_STAR_MAX_REPEAT).
+
+        Ogni sequenza compare una sola volta, nell'ordine in cui è stata
+        generata: a ogni livello si estendono solo le sequenze nuove, perché
+        quelle già viste hanno già prodotto le loro estensioni.
         """
+        if max_repeat is None:
+            max_repeat = get_settings().RPQ_STAR_MAX_REPEAT
 
-        result: List[List[Atom]] = [[]]  # epsilon
+        result: List[Seq] = [()]  # epsilon
+        seen = {()}
 
-        current = alts
+        steps = list(dict.fromkeys(alts))
+        current = steps
         for _ in range(1, max_repeat + 1):
-            result.extend(current)
-            nxt = []
-            for seq in current:
-                for a in alts:
-                    nxt.append(seq + a)
-            current = nxt
+            fresh = [seq for seq in current if seq not in seen]
+            if not fresh:
+                break
+            seen.update(fresh)
+            result.extend(fresh)
+            current = list(dict.fromkeys(seq + a for seq in fresh for a in steps))
 
         return result
 
 
-def parse_rpq(expr: str) -> List[List[Atom]]:
+def parse_rpq(expr: str) -> List[Seq]:
     """
     Parsea una sola RPQ (senza nome).
-    Ritorna una lista di alternative, ciascuna una lista di (inv, label).
+    Ritorna una lista di alternative, ciascuna una tupla di (inv, label).
     """
     expr = expr.strip().replace("∣", "|")  # normalizza OR
-    tokens = _tokenize(expr)
-    parser = _RPQParser(tokens)
-    return parser.parse_rpq()
+    return list(_parse_rpq_cached(expr))
+
+
+# Parsing di una RPQ già normalizzata, in cache: la stessa parte sinistra
+# o destra ricorre spesso in più vincoli. Le alternative sono restituite
+# come tupla (immutabile), così il valore in cache non può essere alterato.
+@lru_cache(maxsize=1024)
+def _parse_rpq_cached(expr: str) -> Tuple[Seq, ...]:
+    return tuple(_RPQParser(_tokenize(expr)).parse_rpq())
 
 
 # PARSER VINCOLI RPC
-def parse_rpc(constraint_str: str) -> Tuple[str, List[List[Atom]], List[List[Atom]]]:
+
+# Separatore tra nome e corpo del vincolo: il primo '=' o ':'
+_NAME_SEP_RE = re.compile(r"[=:]")
+
+
+def parse_rpc(constraint_str: str) -> Tuple[str, List[Seq], List[Seq]]:
     """
     Parsea un vincolo RPC:
 
@@ -261,20 +298,14 @@ def parse_rpc(constraint_str: str) -> Tuple[str, List[List[Atom]], List[List[Ato
     # normalizza <= in ⊆
     s = s.replace("<=", "⊆")
 
-    # Nome del vincolo
-    eq_pos = s.find("=")
-    colon_pos = s.find(":")
-
-    if eq_pos == -1 and colon_pos == -1:
+    # Nome del vincolo: fino al primo separatore, trovato con una sola
+    # scansione
+    sep = _NAME_SEP_RE.search(s)
+    if sep is None:
         raise ValueError("Manca '=' o ':' nel vincolo RPC")
 
-    if eq_pos != -1 and (colon_pos == -1 or eq_pos < colon_pos):
-        name_end = eq_pos
-    else:
-        name_end = colon_pos
-
-    name = s[:name_end].strip()
-    body = s[name_end + 1 :].strip()
+    name = s[:sep.start()].strip()
+    body = s[sep.end():]
 
     if not name:
         raise ValueError("Nome del vincolo mancante")
@@ -283,6 +314,7 @@ def parse_rpc(constraint_str: str) -> Tuple[str, List[List[Atom]], List[List[Ato
     if len(parts) != 2:
         raise ValueError("Il vincolo deve contenere esattamente un simbolo '⊆'")
 
+    # le due parti sono ripulite qui: non serve uno strip anche del corpo
     lhs_str = parts[0].strip()
     rhs_str = parts[1].strip()
 
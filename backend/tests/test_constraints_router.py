@@ -0,0 +1,65 @@
+"""
+Test degli endpoint dei vincoli di schema (validazione, import), con lo
+schema del grafo simulato invece di interrogare Neo4j.
+"""
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.routers import constraints as router
+from app.main import app
+from app.services import constraints_service
+
+CONSTRAINTS = [
+    {"type": "node_label_included", "label": "Missing"},
+    {"type": "edge_type_between", "from_label": "Person", "rel_type": "knows", "to_label": "Person"},
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fake_schema(db=None):
+        return {"Person"}, {"knows"}
+
+    monkeypatch.setattr(constraints_service, "load_schema_from_db", fake_schema)
+    monkeypatch.setattr(constraints_service, "get_current_database_or_default", lambda: "test")
+    constraints_service.clear_validation_cache()
+    # Nessun context manager: il lifespan (driver Neo4j) non viene avviato.
+    yield TestClient(app)
+    constraints_service.clear_validation_cache()
+
+
+def _import(client, constraints):
+    body = orjson.dumps({"constraints": constraints})
+    return client.post("/api/constraints/import", files={"file": ("c.json", body, "application/json")})
+
+
+def test_import_validates_against_schema(client):
+    res = _import(client, CONSTRAINTS).json()
+    assert res["ok"] is False
+    assert [e["field"] for e in res["errors"]] == ["label"]
+
+
+def test_import_does_not_poison_validation_cache(client):
+    _import(client, CONSTRAINTS)
+    res = client.post("/api/constraints/validate", json={"constraints": CONSTRAINTS}).json()
+    assert res["ok"] is False
+
+
+def test_import_rejects_malformed_constraints(client):
+    res = _import(client, [{"type": "node_label_included"}])
+    assert res.status_code == 400
+
+
+def test_import_rejects_oversized_file(client, monkeypatch):
+    monkeypatch.setattr(router, "_MAX_UPLOAD_SIZE", 10)
+    res = _import(client, CONSTRAINTS)
+    assert res.status_code == 413
+
+
+def test_import_maps_large_uploads(client, monkeypatch):
+    # Soglia bassa: anche il file di prova passa dal ramo mmap.
+    monkeypatch.setattr(router, "_MMAP_MIN_SIZE", 1)
+    res = _import(client, CONSTRAINTS).json()
+    assert res["constraints"] == CONSTRAINTS
@@ -0,0 +1,35 @@
+"""
+Test del disegno dell'immagine del grafo con Graphviz. pygraphviz è
+opzionale: senza il pacchetto i test vengono saltati.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import networkx as nx
+import pytest
+
+pytest.importorskip("pygraphviz")
+
+from app.api.routers import graph  # noqa: E402
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+def _sample_graph(k):
+    G = nx.DiGraph()
+    G.add_nodes_from(range(k))
+    for i in range(k):
+        G.add_edge(i, (i + 1) % k, label="next")
+    return G, {i: f"n{i}" for i in range(k)}
+
+
+def test_render_png_graphviz_returns_png():
+    G, labels_map = _sample_graph(5)
+    assert graph._render_png_graphviz(G, labels_map).startswith(PNG_MAGIC)
+
+
+def test_render_png_graphviz_is_safe_under_concurrency():
+    graphs = [_sample_graph(k) for k in range(3, 11)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pngs = list(pool.map(lambda g: graph._render_png_graphviz(*g), graphs))
+    assert all(png.startswith(PNG_MAGIC) for png in pngs)
@@ -0,0 +1,206 @@
+"""
+Test degli helper di calcolo delle misure di inconsistenza (measures).
+
+Gli helper sono confrontati con le implementazioni originali, a forza
+bruta, su casi mirati; la valutazione parallela dei vincoli usa funzioni
+di valutazione simulate, senza Neo4j.
+"""
+
+import threading
+
+import pytest
+
+from app.services import measures
+
+
+# Vincoli fittizi nel formato di `parsed`: (nome, lhs, rhs, errori).
+def _parsed(n):
+    return [(f"C{i}", (i,), (), []) for i in range(n)]
+
+
+def test_evaluate_parallel_keeps_order_and_uses_request_session():
+    sessions = {}
+
+    def evaluate(lhs, rhs, session, db):
+        sessions[lhs[0]] = session
+        return lhs[0] * 10
+
+    parsed = _parsed(5)
+    results = measures._evaluate_parallel(evaluate, parsed, [0, 2, 4], "request-session", "db")
+    assert results == {0: 0, 2: 20, 4: 40}
+    assert sessions == {0: "request-session", 2: None, 4: None}
+
+
+def test_evaluate_parallel_drains_pending_queries_on_failure(monkeypatch):
+    workers = measures._CONSTRAINT_WORKERS
+    # Tutti i thread del pool occupati, più il vincolo sulla sessione
+    # della richiesta; i timeout servono solo a non bloccare il test.
+    all_busy = threading.Barrier(workers + 1, timeout=5)
+    release = threading.Event()
+    started, finished = [], []
+
+    def evaluate(lhs, rhs, session, db):
+        i = lhs[0]
+        if i == 0:
+            # Il vincolo sulla sessione della richiesta fallisce mentre
+            # le altre valutazioni sono in corso o in coda.
+            all_busy.wait()
+            raise RuntimeError("query fallita")
+        started.append(i)
+        all_busy.wait()
+        assert release.wait(5)
+        finished.append(i)
+        return i
+
+    # Le valutazioni in corso vengono sbloccate solo quando
+    # _evaluate_parallel ha già annullato quelle in coda e ne attende la fine.
+    real_wait = measures.wait
+
+    def wait_then_release(futures):
+        release.set()
+        return real_wait(futures)
+
+    monkeypatch.setattr(measures, "wait", wait_then_release)
+
+    n = workers + 6
+    with pytest.raises(RuntimeError):
+        measures._evaluate_parallel(evaluate, _parsed(n), list(range(n)), "s", "db")
+
+    # All'uscita nessuna valutazione è ancora in corso: quelle partite sono
+    # terminate, le altre sono state annullate prima di iniziare.
+    assert release.is_set()
+    assert sorted(finished) == sorted(started)
+    assert len(started) == workers
+
+
+# Implementazione originale: S è minimale se nessun altro insieme della
+# lista ne è un sottoinsieme stretto.
+def _baseline_minimal_indices(sets):
+    return [
+        i for i, S in enumerate(sets)
+        if not any(T < S for j, T in enumerate(sets) if i != j)
+    ]
+
+
+A, B, C = (1, 2, "a"), (2, 3, "b"), (3, 3, "a")
+
+
+@pytest.mark.parametrize("sets", [
+    # Nessun insieme.
+    [],
+    # Insiemi ripetuti: nessuno dei due è sottoinsieme stretto dell'altro.
+    [frozenset({A, B}), frozenset({A, B})],
+    # Sottoinsiemi annidati, in ordine qualsiasi.
+    [frozenset({A, B, C}), frozenset({A}), frozenset({A, B})],
+    # Insiemi disgiunti e un cappio.
+    [frozenset({A}), frozenset({C}), frozenset({A, C}), frozenset({B})],
+    # Insieme vuoto: è sottoinsieme stretto di tutti gli altri.
+    [frozenset({A}), frozenset(), frozenset()],
+], ids=["empty", "duplicates", "nested", "disjoint", "empty-set"])
+def test_minimal_indices_matches_baseline(sets):
+    assert measures._minimal_indices(sets) == _baseline_minimal_indices(sets)
+
+
+# Trie degli insiemi indicati, costruito come in _minimal_indices.
+def _build_trie(sets):
+    trie = {}
+    for S in sets:
+        node = trie
+        for e in sorted(S):
+            node = node.setdefault(e, {})
+        node[measures._END] = True
+    return trie
+
+
+D = (4, 1, "b")
+
+
+@pytest.mark.parametrize("stored, query, expected", [
+    # Trie vuoto: nessun sottoinsieme.
+    ([], {A, B}, False),
+    # L'insieme vuoto è sottoinsieme di tutto.
+    ([frozenset()], {A}, True),
+    # Insieme uguale e sottoinsieme stretto.
+    ([frozenset({A, B})], {A, B}, True),
+    ([frozenset({A, C})], {A, B, C}, True),
+    # Prefisso comune nel trie ma elemento mancante nella query.
+    ([frozenset({A, B, D})], {A, B, C}, False),
+    # Il sottoinsieme è su un ramo che salta elementi della query.
+    ([frozenset({A, B, D}), frozenset({C})], {A, C, D}, True),
+    # Solo soprainsiemi nel trie.
+    ([frozenset({A, B, C})], {A, C}, False),
+], ids=["empty-trie", "empty-set", "equal", "strict", "missing", "skip", "superset"])
+def test_trie_has_subset_matches_brute_force(stored, query, expected):
+    trie = _build_trie(stored)
+    assert any(T <= query for T in stored) == expected
+    assert measures._trie_has_subset(trie, tuple(sorted(query))) == expected
+
+
+# Vertex cover greedy originale, ricalcolando i gradi a ogni passo. A
+# parità di grado si sceglie l'id più piccolo, come fa l'heap (l'originale
+# prendeva il primo vertice nell'ordine del dict).
+def _baseline_vertex_cover(pairs):
+    pairs_left = set(pairs)
+    removed = set()
+    while pairs_left:
+        freq = {}
+        for a, b in pairs_left:
+            freq[a] = freq.get(a, 0) + 1
+            freq[b] = freq.get(b, 0) + 1
+        v_star = max(freq, key=lambda v: (freq[v], -v))
+        removed.add(v_star)
+        pairs_left = {(a, b) for (a, b) in pairs_left if a != v_star and b != v_star}
+    return removed
+
+
+@pytest.mark.parametrize("pairs", [
+    # Nessuna coppia.
+    set(),
+    # Solo cappi: ogni vertice entra nella copertura.
+    {(1, 1), (2, 2)},
+    # Stella: basta il centro.
+    {(0, 1), (0, 2), (0, 3), (4, 0)},
+    # Parità di grado lungo un cammino: vince l'id più piccolo.
+    {(1, 2), (2, 3), (3, 4)},
+    # Ciclo con entrambi i versi di una coppia e un cappio.
+    {(1, 2), (2, 1), (2, 3), (3, 1), (3, 3)},
+], ids=["empty", "self-loops", "star", "ties", "cycle"])
+def test_greedy_vertex_cover_matches_baseline(pairs):
+    cover = measures._greedy_vertex_cover(pairs)
+    assert cover == _baseline_vertex_cover(pairs)
+    assert all(u in cover or v in cover for u, v in pairs)
+
+
+# Sessione simulata: restituisce per ogni coppia gli id del cammino
+# indicato e registra le query ricevute.
+class _FakeSession:
+    def __init__(self, node_ids):
+        self.node_ids = node_ids
+        self.queries = []
+
+    def run(self, query, pairs):
+        self.queries.append(query)
+        return [(u, v, self.node_ids) for u, v in pairs]
+
+
+def test_witness_paths_follow_inverse_steps():
+    seq = ((False, "child_of"), (True, "child_of"))
+    session = _FakeSession([1, 2, 3])
+    paths = measures.witness_paths_batch(seq, [(1, 3)], session)
+
+    assert "(n0)-[:`child_of`]->(n1)<-[:`child_of`]-(n2)" in session.queries[0]
+    # Il passo inverso è l'arco reale 3 -[child_of]-> 2.
+    assert paths == {(1, 3): [(1, 2, "child_of"), (3, 2, "child_of")]}
+
+
+def test_witness_paths_skip_empty_sequence_from_star():
+    # a* ⊆ b: la sequenza vuota viene prima di (a,) ma non è un testimone;
+    # ogni coppia deve ricevere il cammino di (a,).
+    a = ((False, "a"),)
+    source = {(1, 2): [(), a, a + a], (2, 3): [(), a]}
+    session = _FakeSession(None)
+    session.run = lambda query, pairs: [(u, v, [u, v]) for u, v in pairs]
+
+    paths = measures.witness_paths_for_violations(source, session)
+    assert paths == [[(1, 2, "a")], [(2, 3, "a")]]
+    assert measures.witness_paths_batch((), [(1, 1)], session) == {}
@@ -0,0 +1,144 @@
+"""
+Test della valutazione dei vincoli RPQ (rpq_inclusion).
+
+I test sul testo Cypher non richiedono Neo4j. Il confronto con la vecchia
+differenza insiemistica (una query per sequenza, LHS \\ RHS in Python)
+viene eseguito solo se NEO4J_TEST_DB indica un database usa e getta: il
+suo contenuto viene cancellato e sostituito da grafi casuali.
+"""
+
+import os
+import random
+
+import pytest
+
+from app.services import rpq_inclusion
+from app.services.rpq_inclusion import (
+    _violation_exists_query,
+    _violations_query,
+    check_inclusion,
+    has_violation,
+    parse_constraint,
+    violations_for_constraint,
+)
+
+LABELS = ("a", "b", "c")
+
+# Vincoli con lo star (quindi con l'alternativa epsilon) a destra, a
+# sinistra o da entrambe le parti.
+STAR_CONSTRAINTS = [
+    "C1=a⊆b*",
+    "C2=a.b⊆(a|b)*",
+    "C3=a*⊆b",
+    "C4=a*⊆a.a|b*",
+    "C5=(a|b).c⊆c*.^a",
+    "C6=^a.b⊆^c*",
+    "C7=a*.b⊆b|a.b",
+]
+
+
+def test_epsilon_rhs_is_identity_predicate():
+    _, lhs, rhs = parse_constraint("C=child_of⊆son_of*")
+    assert () in rhs
+    query = _violations_query(lhs, rhs)
+    assert "a = b" in query
+    assert "EXISTS { (a) }" not in query
+
+
+# Sessione sul database di test, svuotato prima e dopo i test.
+@pytest.fixture(scope="module")
+def test_db():
+    db = os.environ.get("NEO4J_TEST_DB")
+    if not db:
+        pytest.skip("NEO4J_TEST_DB non impostato")
+
+    from app.database.neo4j import get_session
+
+    with get_session(db) as s:
+        s.run("MATCH (n) DETACH DELETE n").consume()
+        yield db, s
+        s.run("MATCH (n) DETACH DELETE n").consume()
+
+
+# Carica nel database un grafo casuale con `n` nodi ed etichette LABELS.
+def _load_random_graph(session, rnd: random.Random, n: int):
+    edges = [
+        {"u": rnd.randrange(n), "v": rnd.randrange(n), "rel": rnd.choice(LABELS)}
+        for _ in range(rnd.randint(n, 3 * n))
+    ]
+    session.run("MATCH (n) DETACH DELETE n").consume()
+    session.run("UNWIND range(0, $n - 1) AS i CREATE (:T {i: i})", n=n).consume()
+    for rel in LABELS:
+        session.run(
+            f"UNWIND $edges AS e MATCH (x:T {{i: e.u}}), (y:T {{i: e.v}}) "
+            f"CREATE (x)-[:`{rel}`]->(y)",
+            edges=[e for e in edges if e["rel"] == rel],
+        ).consume()
+
+
+# Semantica originale: coppie di ogni alternativa con una query per
+# sequenza, unite e sottratte in Python.
+def _baseline_difference(session, lhs, rhs):
+    def pairs(alts):
+        out = set()
+        for seq in alts:
+            query = (
+                f"{rpq_inclusion._sequence_match(seq)} "
+                f"RETURN DISTINCT id(n0) AS u, id(n{len(seq)}) AS v"
+            )
+            out |= {(u, v) for u, v in session.run(query)}
+        return out
+
+    lhs_pairs, rhs_pairs = pairs(lhs), pairs(rhs)
+    return len(lhs_pairs), len(rhs_pairs), lhs_pairs - rhs_pairs
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_violations_match_set_difference(test_db, seed):
+    db, session = test_db
+    rnd = random.Random(seed)
+    _load_random_graph(session, rnd, rnd.randint(2, 8))
+    rpq_inclusion.clear_rpq_cache()
+
+    for raw in STAR_CONSTRAINTS:
+        _, lhs, rhs = parse_constraint(raw)
+        expected = _baseline_difference(session, lhs, rhs)
+        assert violations_for_constraint(lhs, rhs, session, db) == expected, raw
+
+
+def test_epsilon_rhs_in_existence_probe():
+    _, lhs, rhs = parse_constraint("C=child_of⊆son_of*")
+    query = _violation_exists_query(lhs, rhs)
+    assert "a = b" in query
+    assert "EXISTS { (a) }" not in query
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_has_violation_matches_set_difference(test_db, seed):
+    db, session = test_db
+    rnd = random.Random(100 + seed)
+    _load_random_graph(session, rnd, rnd.randint(2, 8))
+    rpq_inclusion.clear_rpq_cache()
+
+    for raw in STAR_CONSTRAINTS:
+        _, lhs, rhs = parse_constraint(raw)
+        _, _, expected = _baseline_difference(session, lhs, rhs)
+        assert has_violation(lhs, rhs, session, db) == bool(expected), raw
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_check_inclusion_matches_set_difference(test_db, seed, monkeypatch):
+    db, session = test_db
+    monkeypatch.setattr(rpq_inclusion, "get_current_database_or_default", lambda: db)
+    rnd = random.Random(200 + seed)
+    _load_random_graph(session, rnd, rnd.randint(2, 8))
+    rpq_inclusion.clear_rpq_cache()
+
+    for raw in STAR_CONSTRAINTS:
+        _, lhs, rhs = parse_constraint(raw)
+        lhs_count, rhs_count, expected = _baseline_difference(session, lhs, rhs)
+        result = check_inclusion(raw)
+        assert result["ok"] == (not expected), raw
+        assert (result["lhs_pairs"], result["rhs_pairs"]) == (lhs_count, rhs_count), raw
+        assert result["violations"] == sorted(expected)[:200], raw
+        assert result["violations_count"] == len(expected), raw
@@ -0,0 +1,116 @@
+"""
+Test del parser RPQ (rpq_syntax): le alternative prodotte devono essere
+quelle della grammatica originale (prodotto per la concatenazione, unione
+per l'OR, star espanso fino a RPQ_STAR_MAX_REPEAT ripetizioni), senza
+duplicati e nell'ordine della prima comparsa. I casi sono mirati, più un
+solo controllo su poche espressioni casuali.
+"""
+
+import random
+
+import pytest
+
+from app.config import get_settings
+from app.services.rpq_syntax import _RPQParser, parse_rpc, parse_rpq
+
+MAX_REPEAT = get_settings().RPQ_STAR_MAX_REPEAT
+
+
+# Kleene star originale: epsilon, alts, alts.alts, ... con duplicati.
+def _baseline_star(alts, max_repeat=MAX_REPEAT):
+    result = [()]
+    current = alts
+    for _ in range(max_repeat):
+        result.extend(current)
+        current = [seq + a for seq in current for a in alts]
+    return result
+
+
+def _dedup(alts):
+    return list(dict.fromkeys(alts))
+
+
+# Espressione casuale come (testo, alternative secondo la semantica
+# originale). Ogni sottoespressione composta è tra parentesi.
+def _random_expr(rnd: random.Random, depth: int):
+    if depth == 0 or rnd.random() < 0.3:
+        inv = rnd.random() < 0.3
+        label = rnd.choice(("a", "b", "c_1"))
+        return ("^" if inv else "") + label, [((inv, label),)]
+
+    op = rnd.choice(("concat", "implicit", "alt", "star"))
+    left_text, left = _random_expr(rnd, depth - 1)
+    # Lo star dell'originale cresce come len(left) ** MAX_REPEAT: solo su
+    # sottoespressioni piccole.
+    if op == "star" and len(left) <= 4:
+        return f"({left_text})*", _baseline_star(left)
+
+    right_text, right = _random_expr(rnd, depth - 1)
+    if op in ("alt", "star"):
+        return f"({left_text}) | ({right_text})", left + right
+    sep = "." if op == "concat" else " "
+    return f"({left_text}){sep}({right_text})", [a + b for a in left for b in right]
+
+
+A, IA, B, C = (False, "a"), (True, "a"), (False, "b"), (False, "c")
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Concatenazione esplicita e implicita.
+    ("a.b", [(A, B)]),
+    ("a ^a", [(A, IA)]),
+    # Unione con alternative ripetute: restano nell'ordine della prima
+    # comparsa.
+    ("a|b|a", [(A,), (B,)]),
+    # Prodotto di due unioni.
+    ("(a|b).(c|a)", [(A, C), (A, A), (B, C), (B, A)]),
+    # Concatenazione che produce la stessa sequenza per strade diverse.
+    ("(a|a.a).(a|a.a)", [(A, A), (A, A, A), (A, A, A, A)]),
+    # Star dentro una concatenazione: epsilon lascia il solo suffisso.
+    ("(a)*.b", [(B,)] + [(A,) * k + (B,) for k in range(1, MAX_REPEAT + 1)]),
+], ids=["concat", "implicit", "alt-duplicates", "product", "product-duplicates", "star-concat"])
+def test_parse_rpq_matches_baseline_semantics(text, expected):
+    assert parse_rpq(text) == expected
+
+
+# Unico controllo su espressioni casuali, su pochi semi, contro la
+# semantica originale.
+def test_parse_rpq_matches_baseline_on_random_expressions():
+    rnd = random.Random(0)
+    for _ in range(25):
+        text, expected = _random_expr(rnd, 3)
+        assert parse_rpq(text) == _dedup(expected), text
+
+
+@pytest.mark.parametrize("alts, max_repeat", [
+    # Nessuna ripetizione: solo epsilon.
+    ([(A,)], 0),
+    # Alternative ripetute.
+    ([(A,), (A,), (B,)], 3),
+    # Epsilon tra le alternative: genera sequenze già viste.
+    ([(), (A,)], 4),
+    # Passi inversi e sequenze di lunghezza diversa.
+    ([(IA,), (A, B)], 3),
+], ids=["zero", "duplicates", "epsilon", "inverse"])
+def test_kleene_star_matches_baseline(alts, max_repeat):
+    star = _RPQParser(iter(()))._kleene_star(alts, max_repeat)
+    assert star == _dedup(_baseline_star(alts, max_repeat))
+
+
+def test_star_of_epsilon_and_inverse():
+    assert parse_rpq("(^a)*") == [()] + [((True, "a"),) * k for k in range(1, MAX_REPEAT + 1)]
+    a = [((False, "a"),)]
+    assert parse_rpq("((a)*)*") == _dedup(_baseline_star(_baseline_star(a)))
+
+
+def test_parse_rpc_splits_name_and_sides():
+    name, lhs, rhs = parse_rpc("C_3 = (a|b)*.c <= d*|^e;")
+    assert name == "C_3"
+    assert ((False, "c"),) in lhs and ((False, "a"), (False, "c")) in lhs
+    assert rhs[0] == () and ((True, "e"),) in rhs
+
+
+@pytest.mark.parametrize("expr", ["a..b", "(a|b", "a|", "^", "^(a)", "²a", "a?b", "a . ^"])
+def test_parse_rpq_rejects_invalid_syntax(expr):
+    with pytest.raises(ValueError):
+        parse_rpq(expr)